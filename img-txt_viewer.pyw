@@ -28,18 +28,16 @@ import os
 import re
 import csv
 import sys
-import glob
 import time
 import numpy
 import shutil
 import ctypes
 import zipfile
-import itertools
 import statistics
 import webbrowser
 import subprocess
 import configparser
-from collections import defaultdict, Counter
+from collections import Counter
 
 import tkinter.font
 from tkinter import ttk, Tk, Toplevel, messagebox, filedialog, simpledialog, StringVar, BooleanVar, IntVar, Menu, PanedWindow, Frame, Label, Button, Entry, Checkbutton, Text, Event, TclError
@@ -50,7 +48,16 @@ from PIL import Image, ImageTk, ImageSequence, UnidentifiedImageError
 
 from main.scripts import crop_image, batch_crop_images, resize_image, image_grid
 from main.scripts.PopUpZoom import PopUpZoom as PopUpZoom
+from main.scripts.Autocomplete import Autocomplete as Autocomplete
+from main.scripts.Autocomplete import SuggestionWorker as SuggestionWorker
 from main.scripts.TkToolTip import TkToolTip as ToolTip
+from main.scripts.dataset_index import DatasetIndex as DatasetIndex
+from main.scripts.dataset_index import IndexEntry as IndexEntry
+from main.scripts.folder_watcher import FolderWatcher as FolderWatcher
+from main.scripts.pair_table import PairTable as PairTable
+from main.scripts.pair_table import SubfolderScanner, iter_subfolder_images
+from main.scripts.image_cache import ImageCache, get_scaled_size
+from main.scripts.gif_stream import FrameCache, GifStream
 from main.bin import upscale_image
 
 
@@ -152,96 +159,6 @@ class AboutWindow(Toplevel):
         webbrowser.open(f"{self.github_url}")
 
 
-#endregion
-################################################################################################################################################
-#region - CLASS: Autocomplete
-
-
-class Autocomplete:
-    def __init__(self, data_file, max_suggestions=4, suggestion_threshold=115000, include_my_tags=True):
-        self.max_suggestions = max_suggestions
-        self.suggestion_threshold = suggestion_threshold
-        self.previous_text = None
-        self.previous_suggestions = None
-        self.previous_pattern = None
-        self.data, self.similar_names_dict = self.load_data(data_file, include_my_tags)
-
-
-    def load_data(self, data_file, include_my_tags, additional_file='my_tags.csv'):
-        if getattr(sys, 'frozen', False):
-            application_path = sys._MEIPASS
-        else:
-            application_path = os.path.dirname(os.path.abspath(__file__))
-        data_file_path = os.path.join(application_path, "main/dict", data_file)
-        additional_file_path = os.path.join(application_path, additional_file)
-        data = {}
-        similar_names_dict = defaultdict(list)
-        if os.path.isfile(data_file_path):
-            with open(data_file_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                for row in reader:
-                    if row and not row[0].startswith('###'):
-                        true_name = row[0]
-                        classifier_id = row[1]
-                        similar_names = set(row[3].split(',')) if len(row) > 3 else set()
-                        data[true_name] = (classifier_id, list(similar_names))
-                        for sim_name in similar_names:
-                            similar_names_dict[sim_name].append(true_name)
-        if include_my_tags and os.path.isfile(additional_file_path):
-            with open(additional_file_path, newline='', encoding='utf-8') as csvfile:
-                reader = csv.reader(csvfile)
-                for row in reader:
-                    if row and not row[0].startswith('###'):
-                        true_name = row[0]
-                        similar_names = row[3].split(',') if len(row) > 3 else []
-                        if true_name in data:
-                            data[true_name][1].extend(similar_names)
-                        else:
-                            data[true_name] = ('', similar_names)
-                        for sim_name in similar_names:
-                            similar_names_dict[sim_name].append(true_name)
-        return data, similar_names_dict
-
-
-    def get_suggestion(self, text):
-        if not self.data:
-            return None
-        text_with_underscores = text.replace(" ", "_")
-        text_with_asterisks = re.escape(text_with_underscores).replace("\\*", ".*")
-        pattern = re.compile(text_with_asterisks)
-        suggestions = {}
-        suggestion_threshold = 25000 if not self.previous_suggestions else self.suggestion_threshold
-        for true_name, (classifier_id, similar_names) in itertools.islice(self.data.items(), suggestion_threshold):
-            if pattern.match(true_name):
-                suggestions[true_name] = (classifier_id, similar_names)
-        for sim_name in self.similar_names_dict:
-            if pattern.match(sim_name):
-                for true_name in self.similar_names_dict[sim_name]:
-                    classifier_id, similar_names = self.data[true_name]
-                    suggestions[true_name] = (classifier_id, similar_names)
-        suggestions = list(suggestions.items())
-        suggestions.sort(key=lambda x: self.get_score(x[0], text_with_underscores), reverse=True)
-        self.previous_text = text
-        self.previous_suggestions = suggestions
-        self.previous_pattern = pattern
-        return suggestions[:self.max_suggestions]
-
-
-    def get_score(self, suggestion, text):
-        score = 0
-        if suggestion == text:
-            score += len(text) * 2
-        else:
-            for i in range(len(text)):
-                if i < len(suggestion) and suggestion[i] == text[i]:
-                    score += 1
-                else:
-                    break
-        if self.data[suggestion][0] == '' and suggestion[:3] == text[:3]:
-            score += 1
-        return score
-
-
 #endregion
 ################################################################################################################################################
 #region - CLASS: ImgTxtViewer
@@ -261,7 +178,14 @@ class ImgTxtViewer:
         # Setup tools
         self.config = configparser.ConfigParser()
         self.caption_counter = Counter()
-        self.autocomplete = Autocomplete
+        self.autocomplete = Autocomplete()
+        self.suggestion_worker = SuggestionWorker(self.autocomplete)
+        self.dataset_index = DatasetIndex()
+        self.folder_watcher = FolderWatcher()
+        self.subfolder_scanner = SubfolderScanner()
+        self.subfolder_scan_job = None
+        self.image_cache = ImageCache()
+        self.decoded_image = None
 
 
         # Window drag variables
@@ -271,7 +195,6 @@ class ImgTxtViewer:
 
         # Navigation variables
         self.last_scroll_time = 0
-        self.prev_num_files = 0
         self.current_index = 0
 
 
@@ -284,14 +207,11 @@ class ImgTxtViewer:
 
 
         # Filter variables
-        self.original_image_files = []
-        self.original_text_files = []
         self.filter_string_var = StringVar()
 
 
-        # File lists
-        self.text_files = []
-        self.image_files = []
+        # File lists, image_files and text_files are views of the pair table
+        self.set_pair_table([])
         self.deleted_pairs = []
         self.new_text_files = []
 
@@ -308,14 +228,15 @@ class ImgTxtViewer:
         self.is_alt_arrow_pressed = False
         self.filepath_contains_images_var = False
         self.is_resizing_id = None
+        self.sharpen_job = None
+        self.preview_drawn = None
         self.toggle_zoom_var = None
 
 
         # GIF animation variables
-        self.gif_frames = []
-        self.gif_frame_cache = {}
-        self.frame_durations = []
-        self.current_frame = 0
+        self.gif_stream = None
+        self.gif_frame_cache = FrameCache()
+        self.current_frame_index = 0
         self.current_gif_frame_image = None
         self.animation_job = None
 
@@ -347,6 +268,7 @@ class ImgTxtViewer:
         #self.load_order_object_var = StringVar(value="Image") # Not implemented
         self.load_order_var = StringVar(value="Name (default)")
         self.load_order_direction_var = StringVar(value="Ascending")
+        self.include_subfolders_var = BooleanVar(value=False)
 
 
         # Image Quality
@@ -364,10 +286,13 @@ class ImgTxtViewer:
         self.csv_english_dictionary = BooleanVar(value=False)
         self.colored_suggestion_var = BooleanVar(value=True)
         self.suggestion_quantity_var = IntVar(value=4)
-        self.suggestion_threshold_var = StringVar(value="Normal")
+        self.suggestion_delay_var = IntVar(value=50)
+        self.use_dataset_tags_var = BooleanVar(value=True)
         self.last_word_match_var = BooleanVar(value=False)
         self.selected_suggestion_index = 0
         self.suggestions = []
+        self.suggestion_job = None
+        self.autocomplete_loading_job = None
 
 
         # Bindings
@@ -419,16 +344,11 @@ class ImgTxtViewer:
         dictionaryMenu.add_checkbutton(label="Derpibooru", underline=0, variable=self.csv_derpibooru, command=self.update_autocomplete_dictionary)
         dictionaryMenu.add_checkbutton(label="e621", underline=0, variable=self.csv_e621, command=self.update_autocomplete_dictionary)
         dictionaryMenu.add_separator()
+        dictionaryMenu.add_checkbutton(label="Dataset Tags", underline=1, variable=self.use_dataset_tags_var, command=self.update_autocomplete_dictionary)
+        dictionaryMenu.add_separator()
         dictionaryMenu.add_command(label="Clear Selection", underline=0, command=self.clear_dictionary_csv_selection)
 
 
-        # Suggestion Threshold Menu
-        suggestion_threshold_menu = Menu(self.optionsMenu, tearoff=0)
-        self.optionsMenu.add_cascade(label="Suggestion Threshold", underline=11, state="disable", menu=suggestion_threshold_menu)
-        for level in ["Slow", "Normal", "Fast", "Faster"]:
-            suggestion_threshold_menu.add_radiobutton(label=level, variable=self.suggestion_threshold_var, value=level, command=self.set_suggestion_threshold)
-
-
         # Suggestion Quantity Menu
         suggestion_quantity_menu = Menu(self.optionsMenu, tearoff=0)
         self.optionsMenu.add_cascade(label="Suggestion Quantity", underline=11, state="disable", menu=suggestion_quantity_menu)
@@ -436,6 +356,13 @@ class ImgTxtViewer:
             suggestion_quantity_menu.add_radiobutton(label=str(quantity), variable=self.suggestion_quantity_var, value=quantity, command=lambda suggestion_quantity=quantity: self.set_suggestion_quantity(suggestion_quantity))
 
 
+        # Suggestion Delay Menu
+        suggestion_delay_menu = Menu(self.optionsMenu, tearoff=0)
+        self.optionsMenu.add_cascade(label="Suggestion Delay", underline=11, state="disable", menu=suggestion_delay_menu)
+        for delay in [0, 25, 50, 100, 200, 400]:
+            suggestion_delay_menu.add_radiobutton(label=f"{delay} ms", variable=self.suggestion_delay_var, value=delay)
+
+
         # Match Mode Menu
         match_mode_menu = Menu(self.optionsMenu, tearoff=0)
         self.optionsMenu.add_cascade(label="Match Mode", state="disable", menu=match_mode_menu)
@@ -487,6 +414,10 @@ class ImgTxtViewer:
         load_order_menu.add_radiobutton(label="Ascending", variable=self.load_order_direction_var, value="Ascending", command=self.load_pairs)
         load_order_menu.add_radiobutton(label="Descending", variable=self.load_order_direction_var, value="Descending", command=self.load_pairs)
 
+        # Loading Order Subfolders
+        load_order_menu.add_separator()
+        load_order_menu.add_checkbutton(label="Include Subfolders", variable=self.include_subfolders_var, command=self.load_pairs)
+
         # Reset Settings
         self.optionsMenu.add_separator()
         self.optionsMenu.add_command(label="Reset Settings", underline=1, state="disable", command=self.reset_settings)
@@ -970,8 +901,8 @@ class ImgTxtViewer:
             with open(self.my_tags_csv, 'w') as file:
                 content  = self.remove_extra_newlines(self.custom_dictionary_textbox.get("1.0", "end-1c"))
                 file.write(content)
-                self.update_autocomplete_dictionary()
-                self.refresh_custom_dictionary()
+            self.autocomplete.update_custom_tags()
+            self.refresh_custom_dictionary()
         self.create_custom_dictionary()
         self.tab7_frame = Frame(self.tab7)
         self.tab7_frame.pack(side='top', fill='both', expand=True)
@@ -1151,18 +1082,19 @@ class ImgTxtViewer:
         dictionaryMenu.add_checkbutton(label="Derpibooru", underline=0, variable=self.csv_derpibooru, command=self.update_autocomplete_dictionary)
         dictionaryMenu.add_checkbutton(label="e621", underline=0, variable=self.csv_e621, command=self.update_autocomplete_dictionary)
         dictionaryMenu.add_separator()
+        dictionaryMenu.add_checkbutton(label="Dataset Tags", underline=1, variable=self.use_dataset_tags_var, command=self.update_autocomplete_dictionary)
+        dictionaryMenu.add_separator()
         dictionaryMenu.add_command(label="Clear Selection", underline=0, command=self.clear_dictionary_csv_selection)
-        # Suggestion Threshold
-        suggestion_threshold_menu = Menu(suggestionContext_menu, tearoff=0)
-        suggestionContext_menu.add_cascade(label="Suggestion Threshold", menu=suggestion_threshold_menu)
-        threshold_levels = ["Slow", "Normal", "Fast", "Faster"]
-        for level in threshold_levels:
-            suggestion_threshold_menu.add_radiobutton(label=level, variable=self.suggestion_threshold_var, value=level, command=self.set_suggestion_threshold)
         # Suggestion Quantity
         suggestion_quantity_menu = Menu(suggestionContext_menu, tearoff=0)
         suggestionContext_menu.add_cascade(label="Suggestion Quantity", menu=suggestion_quantity_menu)
         for quantity in range(0, 10):
             suggestion_quantity_menu.add_radiobutton(label=str(quantity), variable=self.suggestion_quantity_var, value=quantity, command=lambda suggestion_quantity=quantity: self.set_suggestion_quantity(suggestion_quantity))
+        # Suggestion Delay
+        suggestion_delay_menu = Menu(suggestionContext_menu, tearoff=0)
+        suggestionContext_menu.add_cascade(label="Suggestion Delay", menu=suggestion_delay_menu)
+        for delay in [0, 25, 50, 100, 200, 400]:
+            suggestion_delay_menu.add_radiobutton(label=f"{delay} ms", variable=self.suggestion_delay_var, value=delay)
         # Match Mode
         match_mode_menu = Menu(suggestionContext_menu, tearoff=0)
         suggestionContext_menu.add_cascade(label="Match Mode", menu=match_mode_menu)
@@ -1262,13 +1194,10 @@ class ImgTxtViewer:
             self.new_text_path = path
         if not self.new_text_path:
             return
-        self.text_files = []
-        for image_file in self.image_files:
-            text_filename = os.path.splitext(os.path.basename(image_file))[0] + ".txt"
-            text_file_path = os.path.join(self.new_text_path, text_filename)
+        self.pair_table.set_text_dir(self.new_text_path)
+        for text_file_path in self.text_files:
             if not os.path.exists(text_file_path):
-                self.new_text_files.append(text_filename)
-            self.text_files.append(text_file_path)
+                self.new_text_files.append(os.path.basename(text_file_path))
         self.show_pair()
         self.update_text_path_indicator()
 
@@ -1373,12 +1302,11 @@ class ImgTxtViewer:
         for i in range(len(self.text_files)):
             index = (start_index + i) % len(self.text_files)
             text_file = self.text_files[index]
-            try:
-                with open(text_file, 'r', encoding="utf-8") as file:
-                    if file.read().strip() == "":
-                        return index
-            except FileNotFoundError:
-                return index
+            if (self.dataset_index.get_text(text_file) or "").strip() == "":
+                # The index may predate an edit made outside the viewer, so the candidate is confirmed from disk.
+                self.dataset_index.update_file(text_file)
+                if (self.dataset_index.get_text(text_file) or "").strip() == "":
+                    return index
         return None
 
 
@@ -1420,8 +1348,8 @@ class ImgTxtViewer:
                              ]
         options_commands =   [
                               "Suggestion Dictionary",
-                              "Suggestion Threshold",
                               "Suggestion Quantity",
+                              "Suggestion Delay",
                               "Match Mode",
                               "Clean-Text",
                               "Auto-Delete Blank Files",
@@ -1563,19 +1491,28 @@ class ImgTxtViewer:
 
 
     def update_suggestions(self, event=None):
-        tags_with_underscore = self.get_tags_with_underscore()
         if event is None:
             event = type('', (), {})()
             event.keysym = ''
             event.char = ''
         cursor_position = self.text_box.index("insert")
         if self.cursor_inside_tag(cursor_position):
+            self.cancel_suggestions()
             self.clear_suggestions()
             return
         if self.handle_suggestion_event(event):
             return
-        text = self.text_box.get("1.0", "insert")
+        self.cancel_suggestions()
         self.clear_suggestions()
+        current_word = self.get_current_word()
+        if current_word and (len(self.selected_csv_files) >= 1 or self.use_dataset_tags_var.get()):
+            self.suggestion_job = self.master.after(self.suggestion_delay_var.get(), self.request_suggestions, current_word)
+        elif not current_word and self.use_dataset_tags_var.get() and not self.last_word_match_var.get():
+            self.suggestion_job = self.master.after(self.suggestion_delay_var.get(), self.request_related_suggestions)
+
+
+    def get_current_word(self):
+        text = self.text_box.get("1.0", "insert")
         if self.last_word_match_var.get():
             words = text.split()
             current_word = words[-1] if words else ''
@@ -1585,29 +1522,57 @@ class ImgTxtViewer:
             else:
                 elements = [element.strip() for element in text.split(',')]
             current_word = elements[-1]
-        current_word = current_word.strip()
-        if current_word and len(self.selected_csv_files) >= 1:
-            suggestions = self.autocomplete.get_suggestion(current_word)
-            suggestions.sort(key=lambda x: self.autocomplete.get_score(x[0], current_word), reverse=True)
-            self.suggestions = [(suggestion[0].replace("_", " ") if suggestion[0] not in tags_with_underscore else suggestion[0], suggestion[1]) for suggestion in suggestions]
-            if self.suggestions:
-                self.highlight_suggestions()
-            else:
-                self.clear_suggestions()
+        return current_word.strip()
+
+
+    def request_suggestions(self, current_word):
+        '''Hand the word to the suggestion worker once typing has paused for the suggestion delay'''
+        self.suggestion_worker.submit(current_word)
+        self.poll_suggestions()
+
+
+    def request_related_suggestions(self):
+        '''Ask the suggestion worker for the folder tags most often used with the tags already in the caption'''
+        self.suggestion_worker.submit('', caption=self.text_box.get("1.0", "end-1c"))
+        self.poll_suggestions()
+
+
+    def poll_suggestions(self):
+        '''Show the worker's suggestions once they are ready, if the word under the cursor is still the one they were made for'''
+        self.suggestion_job = None
+        result = self.suggestion_worker.get_result()
+        if result is None:
+            self.suggestion_job = self.master.after(10, self.poll_suggestions)
+            return
+        current_word, suggestions = result
+        if current_word != self.get_current_word() or self.cursor_inside_tag(self.text_box.index("insert")):
+            return
+        tags_with_underscore = self.get_tags_with_underscore()
+        self.suggestions = [(suggestion[0].replace("_", " ") if suggestion[0] not in tags_with_underscore else suggestion[0], suggestion[1]) for suggestion in suggestions or []]
+        if self.suggestions:
+            self.highlight_suggestions()
         else:
             self.clear_suggestions()
 
 
+    def cancel_suggestions(self):
+        '''Stop waiting for suggestions of a word that is no longer current'''
+        if self.suggestion_job is not None:
+            self.master.after_cancel(self.suggestion_job)
+            self.suggestion_job = None
+        self.suggestion_worker.cancel()
+
+
     def highlight_suggestions(self):
         self.suggestion_textbox.config(state='normal')
         self.suggestion_textbox.delete('1.0', 'end')
-        for i, (s, classifier_id) in enumerate(self.suggestions):
-            classifier_id = classifier_id[0]
+        for i, (s, (classifier_id, similar_names, source)) in enumerate(self.suggestions):
+            colors = self.suggestion_colors.get(source, self.suggestion_colors['None'])
             if classifier_id and classifier_id.isdigit():
-                color_id = int(classifier_id) % len(self.suggestion_colors)
+                color_id = int(classifier_id) % len(colors)
             else:
                 color_id = 0
-            color = self.suggestion_colors[color_id]
+            color = colors.get(color_id, "black")
             if i == self.selected_suggestion_index:
                 self.suggestion_textbox.insert('end', "⚫")
                 self.suggestion_textbox.insert('end', s, color)
@@ -1636,7 +1601,11 @@ class ImgTxtViewer:
         self.selected_suggestion_index = 0
         self.suggestion_textbox.config(state='normal')
         self.suggestion_textbox.delete('1.0', 'end')
-        self.suggestion_textbox.insert('1.0', "...")
+        if self.autocomplete.is_loading():
+            loaded, total = self.autocomplete.progress
+            self.suggestion_textbox.insert('1.0', f"Loading dictionaries... ({loaded}/{total})")
+        else:
+            self.suggestion_textbox.insert('1.0', "...")
         self.suggestion_textbox.config(state='disabled')
 
 
@@ -1652,6 +1621,9 @@ class ImgTxtViewer:
         else:
             elements = [element.strip() for element in text.split('\n' if self.list_mode_var.get() else ',')]
             current_word = elements[-1]
+        if not self.get_current_word():
+            # A related tag fills the empty slot at the cursor, so the separator typed before it is kept.
+            text, current_word = self.text_box.get("1.0", "insert"), ''
         remaining_text = self.text_box.get("insert", "end").rstrip('\n')
         start_of_current_word = "1.0 + {} chars".format(len(text) - len(current_word))
         self.text_box.delete(start_of_current_word, "insert")
@@ -1692,18 +1664,25 @@ class ImgTxtViewer:
             'derpibooru.csv': self.csv_derpibooru
         }
         self.selected_csv_files = [csv_file for csv_file, var in csv_vars.items() if var.get()]
-        if not self.selected_csv_files:
-            self.autocomplete = Autocomplete("None", include_my_tags=self.use_mytags_var.get())
-        else:
-            self.autocomplete = Autocomplete(self.selected_csv_files[0], include_my_tags=self.use_mytags_var.get())
-            for csv_file in self.selected_csv_files[1:]:
-                self.autocomplete.data.update(Autocomplete(csv_file).data, include_my_tags=self.use_mytags_var.get())
+        self.autocomplete.set_dictionaries(self.selected_csv_files, include_my_tags=self.use_mytags_var.get(), background=True)
+        self.autocomplete.include_dataset_tags = self.use_dataset_tags_var.get()
         self.clear_suggestions()
-        self.set_suggestion_color(self.selected_csv_files[0] if self.selected_csv_files else "None")
-        self.set_suggestion_threshold()
+        self.set_suggestion_color()
+        self.check_autocomplete_loading()
 
 
-    def set_suggestion_color(self, csv_file):
+    def check_autocomplete_loading(self):
+        '''Show the dictionary loading progress while the suggestion box is empty, until every dictionary is loaded'''
+        if self.autocomplete_loading_job is not None:
+            self.master.after_cancel(self.autocomplete_loading_job)
+            self.autocomplete_loading_job = None
+        if not self.suggestions:
+            self.clear_suggestions()
+        if self.autocomplete.is_loading():
+            self.autocomplete_loading_job = self.master.after(100, self.check_autocomplete_loading)
+
+
+    def set_suggestion_color(self):
         color_mappings = {
             'None':             {0: "black"},
             'dictionary.csv':   {0: "black",    1: "black",     2: "black",     3: "black",     4: "black",     5: "black",     6: "black",     7: "black",     8: "black"},
@@ -1711,8 +1690,9 @@ class ImgTxtViewer:
             'e621.csv':         {-1: "black",   0: "black",     1: "#f2ac08",   3: "#dd00dd",   4: "#00aa00",   5: "#ed5d1f",   6: "#ff3d3d",   7: "#ff3d3d",   8: "#228822"},
             'derpibooru.csv':   {0: "black",    1: "#e5b021",   3: "#fd9961",   4: "#cf5bbe",   5: "#3c8ad9",   6: "#a6a6a6",   7: "#47abc1",   8: "#7871d0",   9: "#df3647",   10: "#c98f2b",  11: "#e87ebe"}
             }
-        black_mappings = {key: "black" for key in color_mappings[csv_file].keys()}
-        self.suggestion_colors = color_mappings[csv_file] if self.colored_suggestion_var.get() else black_mappings
+        if not self.colored_suggestion_var.get():
+            color_mappings = {csv_file: {key: "black" for key in colors.keys()} for csv_file, colors in color_mappings.items()}
+        self.suggestion_colors = color_mappings
 
 
     def set_suggestion_quantity(self, suggestion_quantity):
@@ -1720,16 +1700,6 @@ class ImgTxtViewer:
         self.update_suggestions(event=None)
 
 
-    def set_suggestion_threshold(self):
-        thresholds = {
-            "Slow"  : 275000,
-            "Normal": 130000,
-            "Fast"  : 75000,
-            "Faster": 40000
-            }
-        self.autocomplete.suggestion_threshold = thresholds.get(self.suggestion_threshold_var.get())
-
-
     def clear_dictionary_csv_selection(self):
         for attr in ['csv_danbooru', 'csv_derpibooru', 'csv_e621', 'csv_english_dictionary']:
             getattr(self, attr).set(False)
@@ -1848,6 +1818,7 @@ class ImgTxtViewer:
         self.info_text.pack_forget()
         current_image_path = self.image_files[self.current_index] if self.image_files else None
         self.refresh_file_lists()
+        self.autocomplete.dataset_tags.set_files(self.text_files, background=True, read_text=self.dataset_index.get_text)
         self.message_label.config(text="No Change", bg="#f0f0f0", fg="black")
         self.enable_menu_options()
         self.create_text_box()
@@ -1865,19 +1836,25 @@ class ImgTxtViewer:
                 self.current_index = 0
 
 
+    def set_pair_table(self, image_files, text_dir=None, prefix=None):
+        '''Replace the image/text pairs, image_files and text_files become views of the new table'''
+        self.pair_table = PairTable(image_files, text_dir, prefix)
+        self.image_files = self.pair_table.image_files
+        self.text_files = self.pair_table.text_files
+
+
     def refresh_file_lists(self):
-        self.image_files = []
-        self.text_files = []
         self.new_text_files = []
+        # Events queued before the folder scan are covered by it, the watcher starts from the same scan.
+        self.folder_watcher.get_events()
+        self.dataset_index.refresh(self.image_dir.get())
+        self.folder_watcher.watch(self.image_dir.get(), {name: (entry.size, entry.mtime_ns) for name, entry in self.dataset_index.entries.items()})
         sort_key = self.get_file_sort_key()
         direction = self.load_order_direction_var.get() == "Descending"
-        files_in_dir = sorted(os.listdir(self.image_dir.get()), key=sort_key, reverse=direction)
+        files_in_dir = sorted(self.dataset_index.entries, key=sort_key, reverse=direction)
         self.validate_files(files_in_dir)
-        self.original_image_files = list(self.image_files)
-        self.original_text_files = list(self.text_files)
         if hasattr(self, 'total_images_label'):
             self.total_images_label.config(text=f"of {len(self.image_files)}")
-        self.prev_num_files = len(files_in_dir)
 
 
     def validate_files(self, files_in_dir):
@@ -1886,15 +1863,62 @@ class ImgTxtViewer:
             for filename in files_in_dir:
                 if self.check_odd_files(filename):
                     self.rename_odd_files(filename)
+        # Pairing runs on the names from the folder scan, normcase matches them the way the filesystem would.
+        image_dir = os.path.join(self.image_dir.get(), "")
+        existing_names = {os.path.normcase(filename) for filename in files_in_dir}
+        image_files = []
         for filename in files_in_dir:
             if filename.lower().endswith((".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")):
-                image_file_path = os.path.join(self.image_dir.get(), filename)
-                self.image_files.append(image_file_path)
+                image_files.append(image_dir + filename)
                 text_filename = os.path.splitext(filename)[0] + ".txt"
-                text_file_path = os.path.join(self.image_dir.get(), text_filename)
-                if not os.path.exists(text_file_path):
+                if os.path.normcase(text_filename) not in existing_names:
                     self.new_text_files.append(filename)
-                self.text_files.append(text_file_path)
+        self.set_pair_table(image_files, prefix=self.image_dir.get())
+        self.load_subfolder_pairs()
+
+
+    def load_subfolder_pairs(self):
+        '''With 'Include Subfolders', stream the pairs of every subfolder into the pair table after the folder's own pairs'''
+        self.subfolder_scanner.cancel()
+        if self.subfolder_scan_job is not None:
+            self.master.after_cancel(self.subfolder_scan_job)
+            self.subfolder_scan_job = None
+        if not self.include_subfolders_var.get():
+            return
+        extensions = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif")
+        self.subfolder_scanner.start(self.image_dir.get(), extensions, self.natural_sort)
+        self.subfolder_scan_job = self.master.after(100, self.poll_subfolder_pairs)
+
+
+    def poll_subfolder_pairs(self):
+        '''Append the subfolders scanned so far, showing the first pair if the folder itself had no images'''
+        self.subfolder_scan_job = None
+        batches = self.subfolder_scanner.get_batches()
+        if batches:
+            was_empty = not self.image_files
+            start = len(self.image_files)
+            for folder, image_files in batches:
+                self.pair_table.extend(image_files)
+            self.autocomplete.dataset_tags.add_files(self.text_files[start:])
+            if hasattr(self, 'total_images_label'):
+                self.total_images_label.config(text=f"of {len(self.image_files)}")
+            if was_empty and hasattr(self, 'text_box'):
+                self.current_index = 0
+                self.show_pair()
+        if batches or not self.subfolder_scanner.done:
+            self.subfolder_scan_job = self.master.after(100, self.poll_subfolder_pairs)
+
+
+    def load_all_pairs(self):
+        '''Bring the pair table up to date before editing every caption, waiting for the subfolder scan so nested captions aren't skipped'''
+        self.check_image_dir()
+        if self.subfolder_scan_job is None:
+            return
+        self.master.after_cancel(self.subfolder_scan_job)
+        self.message_label.config(text="Scanning subfolders...", bg="#f0f0f0", fg="black")
+        self.message_label.update_idletasks()
+        self.subfolder_scanner.wait()
+        self.poll_subfolder_pairs()
 
 
     def load_text_file(self, text_file):
@@ -1909,23 +1933,33 @@ class ImgTxtViewer:
 
     def load_image_file(self, image_file, text_file):
         try:
-            with Image.open(self.image_file) as image_file:
-                self.original_image_size = image_file.size
-                max_size = (self.quality_max_size, self.quality_max_size)
-                image_file.thumbnail(max_size, Image.NEAREST)
-                if image_file.format == 'GIF':
-                    self.gif_frames = [frame.copy() for frame in ImageSequence.Iterator(image_file)]
-                    self.frame_durations = [frame.info['duration'] for frame in ImageSequence.Iterator(image_file)]
-                else:
-                    self.gif_frames = [image_file.copy()]
-                    self.frame_durations = [None]
+            decoded = self.image_cache.load(self.image_file, self.quality_max_size, self.get_preview_size())
         except (FileNotFoundError, UnidentifiedImageError):
             self.update_image_file_count()
-            self.image_files.remove(self.image_file)
-            if text_file in self.text_files:
-                self.text_files.remove(text_file)
+            if self.image_file in self.image_files:
+                self.image_files.remove(self.image_file)
+            self.decoded_image = None
+            return
+        self.decoded_image = decoded
+        self.original_image_size = decoded.original_size
+        return decoded.image
+
+
+    def get_preview_size(self):
+        return self.image_preview.winfo_width(), self.image_preview.winfo_height()
+
+
+    def prefetch_neighbor_images(self, include_current=False):
+        '''Decode the next and previous images in the background while this one is viewed'''
+        num_files = len(self.image_files)
+        if num_files < 2 and not include_current:
             return
-        return image_file
+        offsets = [*range(1, self.image_cache.read_ahead + 1), *range(-1, -self.image_cache.read_behind - 1, -1)]
+        indexes = dict.fromkeys((self.current_index + offset) % num_files for offset in [0, *offsets])
+        if not include_current:
+            indexes.pop(self.current_index, None)
+        paths = [self.image_files[index] for index in indexes]
+        self.image_cache.prefetch(paths, self.quality_max_size, self.get_preview_size())
 
 
     def display_image(self):
@@ -1933,67 +1967,94 @@ class ImgTxtViewer:
             self.image_file = self.image_files[self.current_index]
             text_file = self.text_files[self.current_index] if self.current_index < len(self.text_files) else None
             image = self.load_image_file(self.image_file, text_file)
-            max_img_width = 1280
-            max_img_height = 1280
+            max_img_width, max_img_height = ImageCache.max_scaled_size
             resize_event = Event()
             resize_event.height = self.image_preview.winfo_height()
             resize_event.width = self.image_preview.winfo_width()
             resized_image, resized_width, resized_height = self.resize_and_scale_image(image, max_img_width, max_img_height, resize_event)
-            if image.format == 'GIF':
-                self.frame_iterator = iter(self.gif_frames)
-                self.current_frame_index = 0
-                self.display_animated_gif()
+            if image is not None and self.decoded_image.format == 'GIF':
+                self.play_animated_gif()
             else:
-                self.frame_iterator = None
-                self.current_frame_index = 0
-            self.popup_zoom.set_image(image=image, path=self.image_file)
+                self.stop_animated_gif()
+            self.popup_zoom.set_image(image=image, path=self.image_file, source=self.decoded_image)
             self.popup_zoom.set_resized_image(resized_image, resized_width, resized_height)
+            self.prefetch_neighbor_images()
             return text_file, image, max_img_height, max_img_width
         except ValueError:
             self.check_image_dir()
 
 
-    def display_animated_gif(self):
+    def play_animated_gif(self):
+        self.stop_animated_gif()
+        self.gif_stream = GifStream(self.image_file, self.get_gif_frame_size(), self.gif_frame_cache)
+        self.current_frame_index = 0
+        self.display_animated_gif()
+
+
+    def stop_animated_gif(self):
         if self.animation_job is not None:
             root.after_cancel(self.animation_job)
             self.animation_job = None
-        if self.frame_iterator is not None:
-            try:
-                self.current_frame = next(self.frame_iterator)
-                start_width, start_height = self.current_frame.size
-                scale_factor = min(self.image_preview.winfo_width() / start_width, self.image_preview.winfo_height() / start_height)
-                new_width = int(start_width * scale_factor)
-                new_height = int(start_height * scale_factor)
-                cache_key = (id(self.current_frame), self.current_frame_index, new_width, new_height)
-                if cache_key not in self.gif_frame_cache:
-                    self.current_frame = self.current_frame.convert("RGBA")
-                    self.current_frame = self.current_frame.resize((new_width, new_height), Image.LANCZOS)
-                    self.gif_frame_cache[cache_key] = self.current_frame
-                else:
-                    self.current_frame = self.gif_frame_cache[cache_key]
-                self.current_gif_frame_image = ImageTk.PhotoImage(self.current_frame)
-                self.image_preview.config(image=self.current_gif_frame_image)
-                self.image_preview.image = self.current_gif_frame_image
-                delay = self.frame_durations[self.current_frame_index] if self.frame_durations[self.current_frame_index] else 100
-                self.animation_job = root.after(delay, self.display_animated_gif)
-                self.current_frame_index = (self.current_frame_index + 1) % len(self.gif_frames)
-            except StopIteration:
-                self.frame_iterator = iter(self.gif_frames)
-                self.current_frame_index = 0
-                self.display_animated_gif()
+        if self.gif_stream is not None:
+            self.gif_stream.stop()
+            self.gif_stream = None
+
+
+    def get_gif_frame_size(self):
+        preview_size = self.get_preview_size()
+        return get_scaled_size(self.original_image_size, preview_size, preview_size)
+
+
+    def display_animated_gif(self):
+        '''Show the next frame of the GIF stream, waiting a moment when the stream hasn't decoded it yet.
+        When the stream stopped without it, the GIF has no frames or couldn't be decoded, and its first frame is shown as a still image'''
+        self.animation_job = None
+        stream = self.gif_stream
+        if stream is None:
+            return
+        stream.set_size(self.get_gif_frame_size())
+        if stream.frame_count is not None and self.current_frame_index >= stream.frame_count:
+            self.current_frame_index = 0
+        frame = stream.get_frame(self.current_frame_index)
+        if frame is None:
+            if stream.stopped:
+                self.show_gif_still()
+            else:
+                self.animation_job = root.after(10, self.display_animated_gif)
+            return
+        frame, delay = frame
+        self.current_gif_frame_image = ImageTk.PhotoImage(frame)
+        self.image_preview.config(image=self.current_gif_frame_image)
+        self.image_preview.image = self.current_gif_frame_image
+        self.current_frame_index += 1
+        if stream.frame_count != 1:
+            self.animation_job = root.after(delay, self.display_animated_gif)
+
+
+    def show_gif_still(self):
+        '''Stop the GIF stream and draw the decoded first frame in its place'''
+        self.stop_animated_gif()
+        if self.decoded_image is None:
+            return
+        resize_event = Event()
+        resize_event.width, resize_event.height = self.get_preview_size()
+        resized_image, resized_width, resized_height = self.resize_and_scale_image(self.decoded_image.image, *ImageCache.max_scaled_size, resize_event)
+        self.popup_zoom.set_resized_image(resized_image, resized_width, resized_height)
 
 
     def resize_and_scale_image(self, input_image, max_img_width, max_img_height, event, quality_filter=Image.LANCZOS):
         if input_image is None:
             return None, None, None
         start_width, start_height = self.original_image_size
-        scale_factor = min(event.width / start_width, event.height / start_height)
-        new_width = min(int(start_width * scale_factor), max_img_width)
-        new_height = min(int(start_height * scale_factor), max_img_height)
-        resized_image = input_image.resize((new_width, new_height), quality_filter)
+        new_width, new_height = get_scaled_size(self.original_image_size, (event.width, event.height), (max_img_width, max_img_height))
+        if self.decoded_image is not None and input_image is self.decoded_image.image:
+            resized_image = self.decoded_image.get_scaled((new_width, new_height), quality_filter)
+        else:
+            resized_image = input_image.resize((new_width, new_height), quality_filter)
         output_image = ImageTk.PhotoImage(resized_image)
         self.image_preview.config(image=output_image)
         self.image_preview.image = output_image
+        self.preview_drawn = (input_image, event.width, event.height, quality_filter)
         percent_scale = int((new_width / start_width) * 100)
         self.update_imageinfo(percent_scale)
         return resized_image, new_width, new_height
@@ -2001,10 +2062,14 @@ class ImgTxtViewer:
 
     def show_pair(self):
         if self.image_files:
-            text_file, image, max_img_height, max_img_width = self.display_image()
+            displayed = self.display_image()
+            # display_image returns None when the image couldn't be read, the folder was rescanned instead.
+            if displayed is None:
+                return
+            text_file, image, max_img_height, max_img_width = displayed
             self.load_text_file(text_file)
             self.image_preview.config(width=max_img_width, height=max_img_height)
-            self.image_preview.bind("<Configure>", lambda event: self.resize_and_scale_image(image, max_img_width, max_img_height, event, Image.NEAREST))
+            self.image_preview.bind("<Configure>", self.on_preview_resize)
             self.toggle_list_mode()
             self.clear_suggestions()
             self.highlight_custom_string()
@@ -2022,20 +2087,73 @@ class ImgTxtViewer:
         if hasattr(self, 'text_box'):
             if self.is_resizing_id:
                 root.after_cancel(self.is_resizing_id)
-            self.is_resizing_id = root.after(250, self.refresh_image)
+            self.is_resizing_id = root.after(250, self.settle_image_resize)
+
+
+    def on_preview_resize(self, event):
+        '''Draw a fast NEAREST pass from the decoded image while the preview is resized, the LANCZOS pass waits until it settles'''
+        if self.decoded_image is None:
+            return
+        resized_image, resized_width, resized_height = self.resize_and_scale_image(self.decoded_image.image, *ImageCache.max_scaled_size, event, Image.NEAREST)
+        self.popup_zoom.set_resized_image(resized_image, resized_width, resized_height)
+        if self.is_resizing_id:
+            root.after_cancel(self.is_resizing_id)
+        self.is_resizing_id = root.after(250, self.settle_image_resize)
+
+
+    def settle_image_resize(self):
+        '''Redraw the preview with LANCZOS from the decoded image, a sharper decode is made in the background if the preview outgrew it'''
+        self.is_resizing_id = None
+        decoded = self.decoded_image
+        # A playing GIF is redrawn by its frames, a GIF shown as a still image is redrawn like any other image.
+        if not self.image_files or decoded is None or (decoded.format == 'GIF' and self.gif_stream is not None):
+            return
+        resize_event = Event()
+        resize_event.width, resize_event.height = self.get_preview_size()
+        if self.preview_drawn != (decoded.image, resize_event.width, resize_event.height, Image.LANCZOS):
+            resized_image, resized_width, resized_height = self.resize_and_scale_image(decoded.image, *ImageCache.max_scaled_size, resize_event)
+            self.popup_zoom.set_resized_image(resized_image, resized_width, resized_height)
+        if not decoded.covers((resize_event.width, resize_event.height), self.quality_max_size):
+            self.prefetch_neighbor_images(include_current=True)
+            if self.sharpen_job is not None:
+                root.after_cancel(self.sharpen_job)
+            self.sharpen_job = root.after(100, self.poll_sharper_image, decoded)
+
+
+    def poll_sharper_image(self, decoded, tries=50):
+        '''Swap in the sharper decode of the current image once the cache has it'''
+        self.sharpen_job = None
+        if decoded is not self.decoded_image:
+            return
+        sharper = self.image_cache.get(decoded.path, self.quality_max_size, self.get_preview_size())
+        if sharper is None:
+            if tries > 1:
+                self.sharpen_job = root.after(100, self.poll_sharper_image, decoded, tries - 1)
+            return
+        if sharper.zoom_source is None:
+            sharper.zoom_source = decoded.zoom_source
+        self.decoded_image = sharper
+        resize_event = Event()
+        resize_event.width, resize_event.height = self.get_preview_size()
+        resized_image, resized_width, resized_height = self.resize_and_scale_image(sharper.image, *ImageCache.max_scaled_size, resize_event)
+        self.popup_zoom.set_image(image=sharper.image, path=sharper.path, source=sharper)
+        self.popup_zoom.set_resized_image(resized_image, resized_width, resized_height)
 
 
     def update_imageinfo(self, percent_scale):
         if self.image_files:
             self.image_file = self.image_files[self.current_index]
-            image_info = self.get_image_info(self.image_file)
+            image_info = self.get_image_info(self.image_file, self.decoded_image)
             self.image_label.config(text=f"{image_info['filename']}  |  {image_info['resolution']}  |  {percent_scale}%  |  {image_info['size']}", anchor="w")
 
 
-    def get_image_info(self, image_file):
-        with Image.open(image_file) as image:
-            width, height = image.size
-        size = os.path.getsize(image_file)
+    def get_image_info(self, image_file, decoded=None):
+        if decoded is not None and decoded.path == image_file:
+            (width, height), size = decoded.original_size, decoded.file_size
+        else:
+            with Image.open(image_file) as image:
+                width, height = image.size
+            size = os.path.getsize(image_file)
         size_kb = size / 1024
         size_str = f"{round(size_kb)} KB" if size_kb < 1024 else f"{round(size_kb / 1024, 2)} MB"
         filename = os.path.basename(image_file)
@@ -2109,20 +2227,73 @@ class ImgTxtViewer:
 
 
     def check_image_dir(self):
-        try:
-            num_files_in_dir = len(os.listdir(self.image_dir.get()))
-        except Exception:
+        '''Apply the changes queued by the folder watcher, added and removed images are inserted into or deleted from the pair table in place.
+
+        The file lists are only rebuilt when the watcher lost track of the folder, so a subfolder scan keeps going.
+        '''
+        events = self.folder_watcher.get_events()
+        if not events:
             return
-        if num_files_in_dir != self.prev_num_files:
+        if any(kind == 'rescan' for kind, filename in events):
             self.update_image_file_count()
-            self.prev_num_files = num_files_in_dir
+            return
+        extensions = ('.jpg', '.jpeg', '.jpg_large', '.jfif', '.png', '.webp', '.bmp', '.gif')
+        for kind, filename in events:
+            path = os.path.join(self.image_dir.get(), filename)
+            # The viewer records its own deletes, renames, and saves in the index as it makes them, so their events are skipped.
+            if self.dataset_index.is_current(path):
+                continue
+            self.dataset_index.update_file(path)
+            if filename.lower().endswith('.txt') and path in self.text_files:
+                # A caption edited, added, or removed outside the viewer is recounted, a removed one reads as None and is dropped.
+                self.autocomplete.dataset_tags.update_file(path, self.dataset_index.get_text(path))
+            if not filename.lower().endswith(extensions):
+                continue
+            if os.path.isfile(path):
+                if path not in self.image_files:
+                    self.insert_image_file(path)
+            elif path in self.image_files:
+                self.remove_image_file(path)
+        self.total_images_label.config(text=f"of {len(self.image_files)}")
+
+
+    def insert_image_file(self, image_file):
+        '''Insert an image added to the image folder among the folder's own pairs, in the current load order'''
+        sort_key = self.get_file_sort_key()
+        descending = self.load_order_direction_var.get() == "Descending"
+        key = sort_key(os.path.basename(image_file))
+        folder = os.path.dirname(image_file)
+        position = len(self.image_files)
+        for index, other_file in enumerate(self.image_files):
+            # Subfolder pairs come after the folder's own pairs.
+            if os.path.dirname(other_file) != folder:
+                position = index
+                break
+            other_key = sort_key(os.path.basename(other_file))
+            if (other_key < key) if descending else (other_key > key):
+                position = index
+                break
+        self.image_files.insert(position, image_file)
+        if position <= self.current_index and len(self.image_files) > 1:
+            self.current_index += 1
+
+
+    def remove_image_file(self, image_file):
+        '''Delete the pair of an image removed from the image folder, keeping the current pair selected'''
+        index = self.image_files.index(image_file)
+        del self.image_files[index]
+        if index < self.current_index or self.current_index >= len(self.image_files):
+            self.current_index = max(self.current_index - 1, 0)
 
 
     def update_image_file_count(self):
-        extensions = ['.jpg', '.jpeg', '.jpg_large', '.jfif', '.png', '.webp', '.bmp', '.gif']
-        self.image_files = [file for ext in extensions for file in glob.glob(f"{self.image_dir.get()}/*{ext}")]
-        self.image_files.sort(key=self.natural_sort)
-        self.text_files = [os.path.splitext(file)[0] + '.txt' for file in self.image_files]
+        extensions = ('.jpg', '.jpeg', '.jpg_large', '.jfif', '.png', '.webp', '.bmp', '.gif')
+        self.dataset_index.refresh(self.image_dir.get())
+        image_dir = os.path.join(self.image_dir.get(), "")
+        image_files = [image_dir + filename for filename in self.dataset_index.entries if filename.lower().endswith(extensions)]
+        image_files.sort(key=self.natural_sort)
+        self.set_pair_table(image_files, prefix=self.image_dir.get())
+        self.load_subfolder_pairs()
         self.total_images_label.config(text=f"of {len(self.image_files)}")
 
 
@@ -2210,9 +2381,9 @@ class ImgTxtViewer:
         confirm = messagebox.askokcancel("Search and Replace", "This will replace all occurrences of the text\n\n{}\n\nWith\n\n{}\n\nA backup will be created before making changes.\n\nDo you want to proceed?".format(search_string, replace_string))
         if not confirm:
             return
-        self.backup_text_files()
         if not self.filter_string_var.get():
-            self.update_image_file_count()
+            self.load_all_pairs()
+        self.backup_text_files()
         for text_file in self.text_files:
             try:
                 with open(text_file, 'r', encoding="utf-8") as file:
@@ -2241,9 +2412,9 @@ class ImgTxtViewer:
         confirm = messagebox.askokcancel("Prefix", "This will prefix all text files with:\n\n{}\n\nA backup will be created before making changes.\n\nDo you want to proceed?".format(prefix_text))
         if not confirm:
             return
-        self.backup_text_files()
         if not self.filter_string_var.get():
-            self.update_image_file_count()
+            self.load_all_pairs()
+        self.backup_text_files()
         for text_file in self.text_files:
             try:
                 if not os.path.exists(text_file):
@@ -2271,9 +2442,9 @@ class ImgTxtViewer:
         confirm = messagebox.askokcancel("Append", "This will append all text files with:\n\n{}\n\nA backup will be created before making changes.\n\nDo you want to proceed?".format(append_text))
         if not confirm:
             return
-        self.backup_text_files()
         if not self.filter_string_var.get():
-            self.update_image_file_count()
+            self.load_all_pairs()
+        self.backup_text_files()
         for text_file in self.text_files:
             try:
                 if not os.path.exists(text_file):
@@ -2298,8 +2469,7 @@ class ImgTxtViewer:
             self.image_index_entry.delete(0, "end")
             self.image_index_entry.insert(0, "1")
             return
-        self.filtered_image_files = []
-        self.filtered_text_files = []
+        filtered_image_files = []
         for image_file in self.image_files:
             text_file = os.path.splitext(image_file)[0] + ".txt"
             filedata = ""
@@ -2310,13 +2480,11 @@ class ImgTxtViewer:
                 text_file = text_file
             if self.filter_empty_files_var.get():
                 if not filedata.strip():
-                    self.filtered_image_files.append(image_file)
-                    self.filtered_text_files.append(text_file)
+                    filtered_image_files.append(image_file)
             else:
                 if self.filter_use_regex_var:
                     if re.search(filter_string, filedata):
-                        self.filtered_image_files.append(image_file)
-                        self.filtered_text_files.append(text_file)
+                        filtered_image_files.append(image_file)
                 else:
                     filters = filter_string.split(' + ')
                     match = True
@@ -2329,10 +2497,8 @@ class ImgTxtViewer:
                             match = False
                             break
                     if match:
-                        self.filtered_image_files.append(image_file)
-                        self.filtered_text_files.append(text_file)
-        self.image_files = self.filtered_image_files
-        self.text_files = self.filtered_text_files
+                        filtered_image_files.append(image_file)
+        self.set_pair_table(filtered_image_files)
         if hasattr(self, 'total_images_label'):
             self.total_images_label.config(text=f"of {len(self.image_files)}")
         self.current_index = 0
@@ -2483,7 +2649,7 @@ class ImgTxtViewer:
                 np_img[y_offset+height:, :] = np_img[y_offset+height-1:y_offset+height, :]
                 filled_img = Image.fromarray(np_img)
                 filled_img.save(new_filepath, quality=100 if file_extension in {".jpg", ".jpeg", ".jfif", ".jpg_large"} else 100)
-                self.check_image_dir()
+                self.update_image_file_count()
                 index_value = int(self.image_files.index(new_filename))
                 self.jump_to_image(index_value)
         except Exception as e:
@@ -2760,7 +2926,7 @@ class ImgTxtViewer:
                     longest_words.add(word)
                     if len(longest_words) > 5:
                         longest_words = set(sorted(longest_words, key=len, reverse=True)[:5])
-                total_text_filesize += os.path.getsize(text_file)
+                total_text_filesize += self.dataset_index.get_size(text_file)
             except FileNotFoundError: pass
             except Exception as e:
                 print(f"ERROR reading: {os.path.basename(text_file)}: {e}")
@@ -2770,7 +2936,7 @@ class ImgTxtViewer:
             for image_file in self.image_files:
                 try:
                     width, height, dpi, aspect_ratio, image_format = self.process_image_file(image_file)
-                    total_image_filesize += os.path.getsize(image_file)
+                    total_image_filesize += self.dataset_index.get_size(image_file)
                     image_formats.add(image_format)
                     total_ppi += dpi[0]
                     image_resolutions_counter[(width, height)] += 1
@@ -2784,6 +2950,7 @@ class ImgTxtViewer:
                 except FileNotFoundError: pass
                 except Exception as e:
                     print(f"ERROR reading: {os.path.basename(image_file)}: {e}")
+        self.dataset_index.commit()
 
         # Calculate averages
         avg_chars = total_chars / num_txt_files if num_txt_files > 0 else 0
@@ -2926,11 +3093,12 @@ class ImgTxtViewer:
 
 
     def filter_and_update_textfiles(self):
-        self.text_files = [text_file for text_file in self.text_files if os.path.exists(text_file)]
-        num_txt_files, num_img_files = len(self.text_files), len(self.image_files)
+        num_txt_files, num_img_files = sum(1 for text_file in self.text_files if os.path.exists(text_file)), len(self.image_files)
         num_total_files = num_img_files + num_txt_files
         formatted_total_files = f"{num_total_files} (Text: {num_txt_files}, Images: {num_img_files})"
-        self.refresh_file_lists()
+        # Reloading would drop the subfolder pairs streamed in so far, and move the current index with them.
+        if not self.include_subfolders_var.get():
+            self.refresh_file_lists()
         return num_total_files, num_txt_files, num_img_files, formatted_total_files
 
 
@@ -2944,8 +3112,9 @@ class ImgTxtViewer:
 
 
     def process_text_file(self, text_file):
-        with open(text_file, 'r', encoding="utf-8") as file:
-            filedata = file.read()
+        filedata = self.dataset_index.get_text(text_file)
+        if filedata is None:
+            raise FileNotFoundError(text_file)
         words = re.findall(r'\b\w+\b', filedata.lower())
         sentences = re.split(r'[.!?]', filedata)
         paragraphs = filedata.split('\n\n')
@@ -2954,22 +3123,9 @@ class ImgTxtViewer:
 
 
     def process_image_file(self, image_file):
-        with Image.open(image_file) as image:
-            width, height = image.size
-            dpi = image.info.get('dpi', (0, 0))
-            if isinstance(dpi, tuple) and len(dpi) == 2:
-                try:
-                    dpi = (float(dpi[0]), float(dpi[1]))
-                except ValueError:
-                    diagonal_pixels = (width**2 + height**2)**0.5
-                    diagonal_inches = 10
-                    dpi = (diagonal_pixels / diagonal_inches, diagonal_pixels / diagonal_inches)
-            else:
-                diagonal_pixels = (width**2 + height**2)**0.5
-                diagonal_inches = 10
-                dpi = (diagonal_pixels / diagonal_inches, diagonal_pixels / diagonal_inches)
-            aspect_ratio = width / height
-        return width, height, dpi, aspect_ratio, image.format
+        width, height, dpi, image_format = self.dataset_index.get_image_info(image_file)
+        aspect_ratio = width / height
+        return width, height, dpi, aspect_ratio, image_format
 
 
     def update_tab8_textbox(self, stats_text, manual_refresh=None):
@@ -3055,8 +3211,8 @@ class ImgTxtViewer:
                     f.seek(0)
                     f.write(cleaned_text)
                     f.truncate()
-            else:
-                return
+                self.autocomplete.dataset_tags.update_file(text_file, cleaned_text)
+                self.dataset_index.update_file(text_file, cleaned_text)
         self.show_pair()
 
 
@@ -3119,6 +3275,7 @@ class ImgTxtViewer:
             self.config.set("Path", "new_text_path", str(os.path.normpath(self.new_text_path)))
             self.config.set("Path", "load_order", str(self.load_order_var.get()))
             self.config.set("Path", "load_order_direction", str(self.load_order_direction_var.get()))
+            self.config.set("Path", "include_subfolders", str(self.include_subfolders_var.get()))
 
             add_section("Autocomplete")
             self.config.set("Autocomplete", "csv_danbooru", str(self.csv_danbooru.get()))
@@ -3126,6 +3283,8 @@ class ImgTxtViewer:
             self.config.set("Autocomplete", "csv_e621", str(self.csv_e621.get()))
             self.config.set("Autocomplete", "csv_english_dictionary", str(self.csv_english_dictionary.get()))
             self.config.set("Autocomplete", "suggestion_quantity", str(self.suggestion_quantity_var.get()))
+            self.config.set("Autocomplete", "suggestion_delay", str(self.suggestion_delay_var.get()))
+            self.config.set("Autocomplete", "use_dataset_tags", str(self.use_dataset_tags_var.get()))
             self.config.set("Autocomplete", "use_colored_suggestions", str(self.colored_suggestion_var.get()))
 
             add_section("Other")
@@ -3166,6 +3325,7 @@ class ImgTxtViewer:
         self.set_text_file_path(str(self.image_dir.get()))
         self.load_order_var.set(value="Name (default)")
         self.load_order_direction_var.set(value="Ascending")
+        self.include_subfolders_var.set(value=False)
         # Autocomplete
         self.csv_danbooru.set(value=True)
         self.csv_derpibooru.set(value=False)
@@ -3173,7 +3333,8 @@ class ImgTxtViewer:
         self.csv_english_dictionary.set(value=False)
         self.colored_suggestion_var.set(value=True)
         self.suggestion_quantity_var.set(value=4)
-        self.suggestion_threshold_var.set(value="Normal")
+        self.suggestion_delay_var.set(value=50)
+        self.use_dataset_tags_var.set(value=True)
         self.last_word_match_var.set(value=False)
         # Other
         self.clear_search_and_replace_tab()
@@ -3228,6 +3389,7 @@ class ImgTxtViewer:
         if last_directory and os.path.exists(last_directory) and messagebox.askyesno("Confirmation", "Reload last directory?"):
             self.load_order_var.set(value=self.config.get("Path", "load_order", fallback="Name (default)"))
             self.load_order_direction_var.set(value=self.config.get("Path", "load_order_direction", fallback="Ascending"))
+            self.include_subfolders_var.set(value=self.config.getboolean("Path", "include_subfolders", fallback=False))
             self.image_dir.set(last_directory)
             self.set_working_directory()
             self.set_text_file_path(str(self.config.get("Path", "new_text_path", fallback=last_directory)))
@@ -3242,6 +3404,8 @@ class ImgTxtViewer:
         self.csv_e621.set(value=self.config.getboolean("Autocomplete", "csv_e621", fallback=False))
         self.csv_english_dictionary.set(value=self.config.getboolean("Autocomplete", "csv_english_dictionary", fallback=False))
         self.suggestion_quantity_var.set(value=self.config.getint("Autocomplete", "suggestion_quantity", fallback=4))
+        self.suggestion_delay_var.set(value=self.config.getint("Autocomplete", "suggestion_delay", fallback=50))
+        self.use_dataset_tags_var.set(value=self.config.getboolean("Autocomplete", "use_dataset_tags", fallback=True))
         self.colored_suggestion_var.set(value=self.config.getboolean("Autocomplete", "use_colored_suggestions", fallback=True))
         self.update_autocomplete_dictionary()
 
@@ -3288,6 +3452,8 @@ class ImgTxtViewer:
             else:
                 with open(text_file, "w+", encoding="utf-8") as f:
                     f.write("")
+            self.autocomplete.dataset_tags.update_file(text_file)
+            self.dataset_index.update_file(text_file, "")
             return True
         if self.cleaning_text_var.get():
             text = self.cleanup_text(text)
@@ -3295,6 +3461,8 @@ class ImgTxtViewer:
             text = ', '.join(text.split('\n'))
         with open(text_file, "w+", encoding="utf-8") as f:
             f.write(text)
+        self.autocomplete.dataset_tags.update_file(text_file, text)
+        self.dataset_index.update_file(text_file, text)
         return True
 
 
@@ -3359,7 +3527,7 @@ class ImgTxtViewer:
             with open(self.my_tags_csv, 'a', newline='', encoding="utf-8") as f:
                 writer = csv.writer(f)
                 writer.writerow([selected_text])
-            self.update_autocomplete_dictionary()
+            self.autocomplete.add_custom_tag(selected_text)
         except (PermissionError, IOError, TclError) as e:
             messagebox.showerror("Error", f"An error occurred while saving the selected to 'my_tags.csv'.\n\n{e}")
 
@@ -3393,20 +3561,33 @@ class ImgTxtViewer:
         if self.load_order_var.get() == "Name (default)":
             sort_key = self.natural_sort
         elif self.load_order_var.get() == "File size":
-            sort_key = lambda x: os.path.getsize(os.path.join(self.image_dir.get(), x))
+            sort_key = lambda x: self.get_file_stat(x).size
         elif self.load_order_var.get() == "Date created":
-            sort_key = lambda x: os.path.getctime(os.path.join(self.image_dir.get(), x))
+            sort_key = lambda x: self.get_file_stat(x).ctime
         elif self.load_order_var.get() == "Extension":
             sort_key = lambda x: os.path.splitext(x)[1]
         elif self.load_order_var.get() == "Last Access time":
-            sort_key = lambda x: os.path.getatime(os.path.join(self.image_dir.get(), x))
+            sort_key = lambda x: self.get_file_stat(x).atime
         elif self.load_order_var.get() == "Last write time":
-            sort_key = lambda x: os.path.getmtime(os.path.join(self.image_dir.get(), x))
+            sort_key = lambda x: self.get_file_stat(x).mtime_ns
         return sort_key
 
 
+    def get_file_stat(self, filename):
+        '''Return the stat data of a file in the image folder from the last folder scan, stat'ing only files the scan didn't see'''
+        entry = self.dataset_index.entries.get(filename)
+        if entry is None:
+            try:
+                stat = os.stat(os.path.join(self.image_dir.get(), filename))
+                entry = IndexEntry(stat.st_size, stat.st_mtime_ns, stat.st_ctime, stat.st_atime)
+            except OSError:
+                entry = IndexEntry(0, 0, 0, 0)
+        return entry
+
+
     def check_if_contains_images(self, directory):
-        if any(fname.lower().endswith(('.jpg', '.jpeg', '.jpg_large', '.jfif', '.png', '.webp', '.bmp', '.gif')) for fname in os.listdir(directory)):
+        extensions = ('.jpg', '.jpeg', '.jpg_large', '.jfif', '.png', '.webp', '.bmp', '.gif')
+        if any(fname.lower().endswith(extensions) for fname in os.listdir(directory)) or (self.include_subfolders_var.get() and next(iter_subfolder_images(directory, extensions), None)):
             self.filepath_contains_images_var = True
             return True
         else:
@@ -3576,6 +3757,17 @@ class ImgTxtViewer:
             if text_file:
                 self.text_files[self.current_index] = new_text_file
             messagebox.showinfo("Success", "The pair has been renamed successfully.")
+            if self.include_subfolders_var.get():
+                # Reloading the folder would restart the subfolder scan, so the renamed row is kept where it is.
+                for old_file, new_file in ((image_file, new_image_file), (text_file, new_text_file)):
+                    if old_file:
+                        self.dataset_index.update_file(old_file)
+                        self.dataset_index.update_file(new_file)
+                if text_file:
+                    self.autocomplete.dataset_tags.update_file(text_file)
+                    self.autocomplete.dataset_tags.update_file(new_text_file, self.dataset_index.get_text(new_text_file))
+                self.show_pair()
+                return
             self.refresh_file_lists()
             self.show_pair()
             new_index = self.image_files.index(new_image_file)
@@ -3659,10 +3851,10 @@ class ImgTxtViewer:
     def backup_text_files(self):
         if not self.check_if_directory():
             return
-        backup_dir = os.path.join(os.path.dirname(self.text_files[0]), 'text_backup')
-        if not os.path.exists(backup_dir):
-            os.makedirs(backup_dir)
         for text_file in self.text_files:
+            # Each folder keeps its own backups, so captions with the same name in different subfolders don't overwrite each other.
+            backup_dir = os.path.join(os.path.dirname(text_file), 'text_backup')
+            os.makedirs(backup_dir, exist_ok=True)
             base = os.path.splitext(text_file)[0]
             new_backup = os.path.join(backup_dir, os.path.basename(base) + ".bak")
             if os.path.exists(text_file):
@@ -3708,20 +3900,27 @@ class ImgTxtViewer:
                     trash_dir = os.path.join(os.path.dirname(self.image_files[self.current_index]), "Trash")
                     os.makedirs(trash_dir, exist_ok=True)
                     deleted_pair = []
-                    for file_list in [self.image_files, self.text_files]:
-                        if os.path.exists(file_list[self.current_index]):
-                            trash_file = os.path.join(trash_dir, os.path.basename(file_list[self.current_index]))
+                    # Both files are read before the pair is deleted, deleting the pair removes it from both views at once.
+                    pair_files = [(self.image_files, self.image_files[self.current_index]), (self.text_files, self.text_files[self.current_index])]
+                    for file_list, file_path in pair_files:
+                        if os.path.exists(file_path):
+                            trash_file = os.path.join(trash_dir, os.path.basename(file_path))
                             try:
-                                os.rename(file_list[self.current_index], trash_file)
+                                os.rename(file_path, trash_file)
                             except FileExistsError:
                                 if not trash_file.endswith("txt"):
                                     if messagebox.askokcancel("Warning", "The file already exists in the trash. Do you want to overwrite it?"):
                                         os.remove(trash_file)
-                                        os.rename(file_list[self.current_index], trash_file)
+                                        os.rename(file_path, trash_file)
                                     else:
                                         return
-                            deleted_pair.append((file_list, self.current_index, trash_file))
-                            del file_list[self.current_index]
+                            # The pair is kept by path, the watcher may rebuild the pair table before it's restored.
+                            deleted_pair.append((file_path, self.current_index, trash_file))
+                            if file_list is self.text_files:
+                                self.autocomplete.dataset_tags.update_file(file_path)
+                            self.dataset_index.update_file(file_path)
+                    if deleted_pair:
+                        del self.image_files[self.current_index]
                     self.deleted_pairs.append(deleted_pair)
                     self.total_images_label.config(text=f"of {len(self.image_files)}")
                     if self.current_index >= len(self.image_files):
@@ -3737,15 +3936,20 @@ class ImgTxtViewer:
             else:  # No, Recycle
                 if self.current_index < len(self.image_files):
                     deleted_pair = []
-                    for file_list in [self.image_files, self.text_files]:
-                        if os.path.exists(file_list[self.current_index]):
+                    pair_files = [(self.image_files, self.image_files[self.current_index]), (self.text_files, self.text_files[self.current_index])]
+                    for file_list, file_path in pair_files:
+                        if os.path.exists(file_path):
                             try:
-                                os.remove(file_list[self.current_index])
+                                os.remove(file_path)
                             except (PermissionError, IOError) as e:
                                 messagebox.showerror("Error", f"An error occurred while deleting the img-txt pair.\n\n{e}")
                                 return
-                            deleted_pair.append((file_list, self.current_index, None))
-                            del file_list[self.current_index]
+                            deleted_pair.append((file_path, self.current_index, None))
+                            if file_list is self.text_files:
+                                self.autocomplete.dataset_tags.update_file(file_path)
+                            self.dataset_index.update_file(file_path)
+                    if deleted_pair:
+                        del self.image_files[self.current_index]
                     self.deleted_pairs = [pair for pair in self.deleted_pairs if pair != deleted_pair]
                     self.total_images_label.config(text=f"of {len(self.image_files)}")
                     if self.current_index >= len(self.image_files):
@@ -3770,16 +3974,25 @@ class ImgTxtViewer:
             if not messagebox.askyesno("Restore Files", "The following files will be restored:\n\n" + "\n".join(files_to_restore) + "\n\nDo you want to proceed?"):
                 self.deleted_pairs.append(deleted_pair)
                 return
-            for file_list, index, trash_file in deleted_pair:
-                original_path = os.path.join(self.image_dir.get(), os.path.basename(trash_file))
+            image_path = text_path = None
+            for original_path, index, trash_file in deleted_pair:
                 shutil.move(trash_file, original_path)
-                file_list.insert(index, original_path)
-                if not original_path.endswith('.txt'):
-                    self.check_image_dir()
-                    index_value = int(self.image_files.index(original_path))
-                    self.jump_to_image(index_value)
+                self.dataset_index.update_file(original_path)
+                if original_path.endswith('.txt'):
+                    text_path = original_path
                 else:
-                    self.load_text_file(original_path)
+                    image_path = original_path
+            # The pair is put back into the current pair table, a deleted row is brought back in place so a subfolder scan keeps going.
+            # If the table was rebuilt since the delete, the pair is inserted at its old position instead.
+            if image_path is not None:
+                if image_path not in self.image_files:
+                    self.image_files.insert(min(index, len(self.image_files)), image_path)
+                self.jump_to_image(self.image_files.index(image_path))
+            elif text_path is not None:
+                self.text_files.insert(index, text_path)
+                self.load_text_file(text_path)
+            if text_path is not None:
+                self.autocomplete.dataset_tags.update_file(text_path, self.dataset_index.get_text(text_path))
             self.total_images_label.config(text=f"of {len(self.image_files)}")
             if not self.deleted_pairs:
                 self.undo_state.set("disabled")
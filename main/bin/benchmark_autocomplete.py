@@ -0,0 +1,254 @@
+################################################################################################################################################
+#region -  Description
+
+
+"""
+########################################
+#                                      #
+#        Benchmark Autocomplete        #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Measure autocomplete load time, resident memory, and per-keystroke query latency without opening the viewer.
+
+Each word of a keystroke stream is typed one character at a time, and every partial word is timed as a query.
+Synthetic streams are built from the bundled CSV files: tag prefixes, wildcards, alias hits, typos, and misses.
+A recorded stream can be given as a text file with one typed word per line.
+
+Every dictionary set runs in its own process, so load time and memory aren't skewed by the sets before it.
+Results are printed as JSON, or written to the --output file.
+
+Example:
+    python main/bin/benchmark_autocomplete.py --sets danbooru merged --words 100 --output before.json
+
+"""
+
+
+#endregion
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import ctypes
+import argparse
+import platform
+import statistics
+import subprocess
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from main.scripts.Autocomplete import Autocomplete, get_application_path
+
+
+#endregion
+################################################################################################################################################
+#region -  Streams
+
+
+DICTIONARY_SETS = {
+    'danbooru': ['danbooru.csv'],
+    'e621': ['e621.csv'],
+    'derpibooru': ['derpibooru.csv'],
+    'dictionary': ['dictionary.csv'],
+    'merged': ['danbooru.csv', 'e621.csv', 'derpibooru.csv', 'dictionary.csv'],
+    }
+STREAM_KINDS = ['prefix', 'wildcard', 'alias', 'typo', 'miss']
+
+
+def read_dictionary_words(data_files, popular_rows=5000):
+    '''Return the most popular true names and their aliases from the CSV files, in file order'''
+    names, aliases = [], []
+    for data_file in data_files:
+        with open(os.path.join(get_application_path(), "main/dict", data_file), newline='', encoding='utf-8') as csvfile:
+            for i, row in enumerate(csv.reader(csvfile)):
+                if i >= popular_rows:
+                    break
+                if not row or row[0].startswith('###'):
+                    continue
+                names.append(row[0])
+                if len(row) > 3:
+                    aliases.extend(alias for alias in row[3].split(',') if alias)
+    return names, aliases
+
+
+def make_typo(word, rng):
+    '''Return word with two neighbouring characters swapped, or one character dropped'''
+    if len(word) < 4:
+        return word + word[-1]
+    i = rng.randrange(1, len(word) - 2)
+    if rng.random() < 0.5:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + word[i + 1:]
+
+
+def build_streams(data_files, words_per_kind, seed):
+    '''Return {kind: [word, ...]} of synthetic words for the dictionary set'''
+    rng = random.Random(seed)
+    names, aliases = read_dictionary_words(data_files)
+    split_names = [name for name in names if '_' in name.strip('_')]
+    streams = {kind: [] for kind in STREAM_KINDS}
+    for _ in range(words_per_kind):
+        streams['prefix'].append(rng.choice(names))
+        if split_names:
+            head, _, tail = rng.choice(split_names).partition('_')
+            streams['wildcard'].append(f"*_{tail[:4]}" if rng.random() < 0.5 else f"{head[:2]}*{tail}")
+        if aliases:
+            streams['alias'].append(rng.choice(aliases))
+        streams['typo'].append(make_typo(rng.choice(names), rng))
+        streams['miss'].append(''.join(rng.choice('qxzjvkw') for _ in range(rng.randint(4, 10))))
+    return streams
+
+
+def read_stream_file(stream_file):
+    with open(stream_file, encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+#endregion
+################################################################################################################################################
+#region -  Measurements
+
+
+def get_resident_memory():
+    '''Return the resident memory of this process in bytes, or None when it can't be read'''
+    if sys.platform == 'win32':
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong), ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t), ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t), ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def summarize(latencies):
+    '''Return the count and the p50/p95/p99/max of latencies, in milliseconds'''
+    if not latencies:
+        return {"count": 0}
+    if len(latencies) == 1:
+        cuts = latencies * 99
+    else:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+    return {
+        "count": len(latencies),
+        "p50_ms": round(cuts[49] * 1000, 4),
+        "p95_ms": round(cuts[94] * 1000, 4),
+        "p99_ms": round(cuts[98] * 1000, 4),
+        "max_ms": round(max(latencies) * 1000, 4),
+        }
+
+
+def run_streams(autocomplete, streams):
+    '''Type every word of each stream one character at a time and return {kind: summary}'''
+    results = {}
+    all_latencies = []
+    for kind, words in streams.items():
+        latencies = []
+        for word in words:
+            for i in range(1, len(word) + 1):
+                start = time.perf_counter()
+                autocomplete.get_suggestion(word[:i])
+                latencies.append(time.perf_counter() - start)
+        results[kind] = summarize(latencies)
+        all_latencies.extend(latencies)
+    results["all"] = summarize(all_latencies)
+    return results
+
+
+def run_benchmark(set_name, data_files, words_per_kind, seed, include_my_tags, stream_file=None):
+    '''Load one dictionary set in this process and return its measurements'''
+    rss_before = get_resident_memory()
+    start = time.perf_counter()
+    autocomplete = Autocomplete(data_files, include_my_tags=include_my_tags)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = get_resident_memory()
+    streams = {"recorded": read_stream_file(stream_file)} if stream_file else build_streams(data_files, words_per_kind, seed)
+    queries = run_streams(autocomplete, streams)
+    rss_after = get_resident_memory()
+    return {
+        "set": set_name,
+        "dictionaries": data_files,
+        "load_seconds": round(load_seconds, 4),
+        "rss_before_bytes": rss_before,
+        "rss_loaded_bytes": rss_loaded,
+        "rss_after_queries_bytes": rss_after,
+        "dictionary_rss_bytes": rss_loaded - rss_before if rss_before is not None and rss_loaded is not None else None,
+        "queries": queries,
+        }
+
+
+#endregion
+################################################################################################################################################
+#region -  Framework
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark autocomplete load time, memory, and query latency')
+    parser.add_argument('--sets', nargs='+', choices=list(DICTIONARY_SETS), default=list(DICTIONARY_SETS), help='Dictionary sets to benchmark')
+    parser.add_argument('--words', type=int, default=50, help='Synthetic words typed per stream kind')
+    parser.add_argument('--seed', type=int, default=1, help='Seed for the synthetic streams')
+    parser.add_argument('--stream', type=str, help='Text file of recorded words, one per line, used instead of the synthetic streams')
+    parser.add_argument('--my-tags', action='store_true', help="Also load 'my_tags.csv'")
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file instead of printing it')
+    parser.add_argument('--single', type=str, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def run_set_process(set_name, args):
+    '''Benchmark one set in a fresh interpreter and return its measurements'''
+    command = [sys.executable, os.path.abspath(__file__), '--single', set_name, '--words', str(args.words), '--seed', str(args.seed)]
+    if args.stream:
+        command += ['--stream', args.stream]
+    if args.my_tags:
+        command.append('--my-tags')
+    output = subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    args = parse_args()
+    if args.single:
+        result = run_benchmark(args.single, DICTIONARY_SETS[args.single], args.words, args.seed, args.my_tags, args.stream)
+        print(json.dumps(result))
+        return
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "words_per_kind": args.words,
+        "seed": args.seed,
+        "stream": args.stream,
+        "results": [run_set_process(set_name, args) for set_name in args.sets],
+        }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
+
+
+#endregion
+################################################################################################################################################
@@ -0,0 +1,191 @@
+################################################################################################################################################
+#region -  Description
+
+
+"""
+########################################
+#                                      #
+#           Benchmark Preview          #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Measure the per-image cost of preparing the preview without opening the viewer.
+
+Two load paths are timed for every image, from opening the file to the image scaled for the preview:
+  - thumbnail: full decode, thumbnail to the quality size with NEAREST, then a LANCZOS resize to the preview.
+  - shrink_on_load: the ImageCache decode, JPEG DCT scaling through draft() and reduce() for other formats.
+The zoom source PopUpZoom reads from the decoded image is timed as zoom_source.
+
+Synthetic 6000px JPEG, PNG and WEBP images are written to a temporary folder, or a folder of images can be given with --folder.
+Palette PNG, 1-bit BMP and 16-bit PNG images are written too, reduce() can't handle their modes so they take the fallback path.
+Results are grouped by extension and mode, printed as JSON, or written to the --output file.
+
+Example:
+    python main/bin/benchmark_preview.py --size 6000 --count 5 --preview 800 600 --output preview.json
+
+"""
+
+
+#endregion
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from PIL import Image
+from main.scripts.image_cache import ImageCache, get_scaled_size
+from main.bin.benchmark_autocomplete import summarize
+
+
+#endregion
+################################################################################################################################################
+#region -  Images
+
+
+FORMATS = {'jpeg': '.jpg', 'png': '.png', 'webp': '.webp'}
+# (mode, extension) of the images written in a mode other than RGB.
+MODE_IMAGES = [('P', '.png'), ('1', '.bmp'), ('I;16', '.png')]
+
+
+def write_images(folder, size, count):
+    '''Write count noisy size x 2/3 size images of each format to folder and return their paths'''
+    width, height = size, size * 2 // 3
+    paths = []
+    for i in range(count):
+        noise = Image.effect_noise((width, height), 48 + i)
+        gradient = Image.linear_gradient('L').resize((width, height))
+        image = Image.merge('RGB', (noise, gradient, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+        for image_format, extension in FORMATS.items():
+            path = os.path.join(folder, f"{i}{extension}")
+            image.save(path, quality=90) if image_format != 'png' else image.save(path, compress_level=1)
+            paths.append(path)
+        for mode, extension in MODE_IMAGES:
+            path = os.path.join(folder, f"{i}_{mode.replace(';', '')}{extension}")
+            convert_mode(image, mode).save(path)
+            paths.append(path)
+    return paths
+
+
+def convert_mode(image, mode):
+    if mode == 'I;16':
+        return image.convert('L').point(lambda value: value * 256, 'I').convert('I;16')
+    return image.convert(mode)
+
+
+def read_folder(folder):
+    extensions = ('.jpg', '.jpeg', '.jpg_large', '.jfif', '.png', '.webp', '.bmp')
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith(extensions))
+
+
+#endregion
+################################################################################################################################################
+#region -  Measurements
+
+
+def load_thumbnail(path, max_size, preview_size):
+    '''The load path used before shrink-on-load'''
+    with Image.open(path) as image:
+        original_size = image.size
+        image.thumbnail((max_size, max_size), Image.NEAREST)
+        return image.resize(get_scaled_size(original_size, preview_size, ImageCache.max_scaled_size), Image.LANCZOS)
+
+
+def load_shrink_on_load(cache, path, max_size, preview_size):
+    return cache.decode(cache.get_key(path, max_size), preview_size).scaled
+
+
+def load_zoom_source(cache, path, max_size, preview_size, zoom_size=4096):
+    return cache.decode(cache.get_key(path, max_size), preview_size).get_zoom_source(zoom_size)
+
+
+def get_image_kind(path):
+    '''Return the extension and mode of an image, the results are grouped by it'''
+    with Image.open(path) as image:
+        return f"{os.path.splitext(path)[1].lower()} {image.mode}"
+
+
+def run_benchmark(paths, max_size, preview_size, repeat):
+    '''Return {"extension mode": {method: summary}} for the two load paths and the zoom source'''
+    cache = ImageCache()
+    methods = {
+        'thumbnail': lambda path: load_thumbnail(path, max_size, preview_size),
+        'shrink_on_load': lambda path: load_shrink_on_load(cache, path, max_size, preview_size),
+        'zoom_source': lambda path: load_zoom_source(cache, path, max_size, preview_size),
+        }
+    latencies = {}
+    for path in paths:
+        kind = get_image_kind(path)
+        for method, load in methods.items():
+            for _ in range(repeat):
+                start = time.perf_counter()
+                load(path)
+                latencies.setdefault(kind, {}).setdefault(method, []).append(time.perf_counter() - start)
+    results = {}
+    for kind, by_method in latencies.items():
+        results[kind] = {method: summarize(values) for method, values in by_method.items()}
+        before, after = results[kind]['thumbnail'], results[kind]['shrink_on_load']
+        results[kind]['p50_speedup'] = round(before['p50_ms'] / after['p50_ms'], 2) if after['p50_ms'] else None
+    return results
+
+
+#endregion
+################################################################################################################################################
+#region -  Framework
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the per-image cost of preparing the preview')
+    parser.add_argument('--folder', type=str, help='Folder of images to time instead of the synthetic images')
+    parser.add_argument('--size', type=int, default=6000, help='Width of the synthetic images')
+    parser.add_argument('--count', type=int, default=3, help='Synthetic images written per format')
+    parser.add_argument('--preview', type=int, nargs=2, default=[800, 600], metavar=('WIDTH', 'HEIGHT'), help='Size of the preview widget')
+    parser.add_argument('--quality', type=int, default=1280, help='Image quality max size, 1536 High, 1280 Normal, 768 Low')
+    parser.add_argument('--repeat', type=int, default=3, help='Times each image is loaded by each method')
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file instead of printing it')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as temp_folder:
+        paths = read_folder(args.folder) if args.folder else write_images(temp_folder, args.size, args.count)
+        results = run_benchmark(paths, args.quality, tuple(args.preview), args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "folder": args.folder,
+        "size": None if args.folder else args.size,
+        "images": len(paths),
+        "preview": args.preview,
+        "quality": args.quality,
+        "repeat": args.repeat,
+        "results": results,
+        }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
+
+
+#endregion
+################################################################################################################################################
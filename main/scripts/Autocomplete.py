@@ -0,0 +1,1383 @@
+"""
+########################################
+#                                      #
+#             Autocomplete             #
+#                                      #
+#   Version : v1.01                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Load the tag dictionaries from 'main/dict' and 'my_tags.csv' and return autocomplete suggestions.
+Each CSV is a separate shard with its own classifiers and aliases, so toggling a dictionary only loads or drops that shard.
+'my_tags.csv' is an editable shard, adding or removing a custom tag edits its key table in place instead of reloading the CSV.
+Shards can be loaded by a background thread, suggestions are served from the shards that are ready in the meantime.
+SuggestionWorker runs queries on a background thread, keeping only the latest request.
+True names and aliases are stored in a single sorted key table, so plain prefix queries are answered with two bisects.
+Each CSV is compiled once into a binary cache file, later loads open the cache instead of parsing the CSV.
+When loading in the background, a CSV without a cache is served parsed but without typo corrections until its cache is compiled.
+The cache is memory-mapped and searched in place, strings are only decoded for the keys a query visits.
+Wildcard queries are answered from a trigram index over the key table, so only keys sharing the typed fragments are checked.
+While typing, each query narrows the matches of the query before it instead of searching the full dictionary again.
+When a plain query finds too few matches, a symmetric delete index suggests tags within one or two typos.
+Tags already used in the open folder are counted by DatasetTags and suggested ahead of the dictionaries.
+An empty tag slot suggests the folder tags most often used together with the tags already in the caption.
+Matches are ranked into a small top-k heap, visiting broad queries in post count order so the walk stops once the top results are settled.
+
+"""
+
+
+import os
+import re
+import sys
+import csv
+import mmap
+import zlib
+import struct
+import threading
+from array import array
+from itertools import accumulate
+from collections import Counter
+from bisect import bisect_left, bisect_right, insort
+from heapq import heappush, heapreplace, nsmallest
+
+
+def get_application_path():
+    '''Return the folder that holds 'main/dict' and 'my_tags.csv\''''
+    if getattr(sys, 'frozen', False):
+        return sys._MEIPASS
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def get_cache_path():
+    '''Return the folder used to store compiled dictionaries'''
+    if getattr(sys, 'frozen', False):
+        return os.path.abspath("dict_cache")
+    return os.path.join(get_application_path(), "main/dict/cache")
+
+
+#region - CLASS: StringTable
+
+
+class StringTable:
+    '''A read-only sequence over the newline separated UTF-8 strings of a blob, each string is decoded only when it's accessed'''
+    def __init__(self, view, start, offsets):
+        self.view = view
+        self.start = start
+        # offsets[n] is where string n starts in the blob, offsets[-1] is one past the end of the blob.
+        self.offsets = offsets
+
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            return self.get_slice(*n.indices(len(self))[:2])
+        if n < 0:
+            n += len(self.offsets) - 1
+        start = self.start
+        return str(self.view[start + self.offsets[n]:start + self.offsets[n + 1] - 1], 'utf-8')
+
+
+    def get_slice(self, start, stop):
+        '''Return strings start to stop as a list, decoding their part of the blob at once'''
+        if start >= stop:
+            return []
+        offset = self.start
+        return str(self.view[offset + self.offsets[start]:offset + self.offsets[stop] - 1], 'utf-8').split('\n')
+
+
+    @staticmethod
+    def pack(strings):
+        '''Return the blob and the offsets of strings'''
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = array('I', [0])
+        offsets.extend(accumulate(len(item) + 1 for item in encoded))
+        return b'\n'.join(encoded), offsets
+
+
+#endregion
+#region - CLASS: TagTable
+
+
+class TagTable:
+    '''A compiled dictionary: true names in file order, their classifier and aliases, and a sorted key table over names and aliases.
+    The table is a view over its cache file, memory-mapped and searched in place, so strings are only decoded for the keys a query visits'''
+    cache_magic = b"ITVDICT\x00"
+    cache_version = 6
+    cache_header = struct.Struct("<8sHHqq")
+    section_count = 18
+    section_align = 8
+    gram_size = 3
+    # Deletes indexed for each key prefix length, queries use the prefix length of the text, up to typo_prefix_length.
+    typo_prefix_length = 6
+    typo_distances = {3: 1, 4: 1, 5: 1, 6: 2}
+    # False for a table parsed without its typo index, while its cache is yet to be compiled.
+    compiled = True
+
+
+    def __init__(self, names, classifier_table, classifier_ids, alias_fields, ranks, keys, key_rows, rank_keys, grams, gram_offsets, gram_postings, typo_buckets, typo_hashes, typo_groups):
+        self.names = names
+        self.classifier_table = classifier_table
+        self.classifier_ids = classifier_ids
+        self.alias_fields = alias_fields
+        # Popularity: ranks[row] is the row's place when sorted by post count, rank_keys lists the key positions in that order.
+        self.ranks = ranks
+        self.keys = keys
+        self.key_rows = key_rows
+        self.rank_keys = rank_keys
+        # Trigram index: gram_postings[gram_offsets[n]:gram_offsets[n + 1]] holds the sorted key positions containing grams[n].
+        self.grams = grams
+        self.gram_offsets = gram_offsets
+        self.gram_postings = gram_postings
+        # Typo index: every string within typo_distances deletes of a key prefix, as sorted CRC-32 hashes seeded with the prefix length.
+        # The hashes with high 16 bits n are typo_hashes[typo_buckets[n]:typo_buckets[n + 1]], which stores only their low 16 bits.
+        # typo_groups[i] is the position of the first key with the prefix that produced typo_hashes[i].
+        self.typo_buckets = typo_buckets
+        self.typo_hashes = typo_hashes
+        self.typo_groups = typo_groups
+        self.source_stat = None
+
+
+    def __len__(self):
+        return len(self.names)
+
+
+    @classmethod
+    def load(cls, csv_path, custom=False, compile_cache=True):
+        '''Return the table for csv_path, mapping the cache when it matches the file.
+        With compile_cache=False a missing cache is left for a later load, the CSV is parsed without the typo index and the table isn't compiled'''
+        if not os.path.isfile(csv_path):
+            return cls.from_rows([])
+        stat = os.stat(csv_path)
+        cache_file = os.path.join(get_cache_path(), os.path.basename(csv_path) + ".bin")
+        table = cls.read_cache(cache_file, stat)
+        if table is None and not compile_cache:
+            with open(csv_path, newline='', encoding='utf-8') as csvfile:
+                table = cls.from_buffer(cls.compile_rows(csv.reader(csvfile), custom, stat, typo_index=False))
+            table.compiled = False
+        elif table is None:
+            with open(csv_path, newline='', encoding='utf-8') as csvfile:
+                buffer = cls.compile_rows(csv.reader(csvfile), custom, stat)
+            # Map the new cache, so the compiled buffer can be freed, or keep the buffer when the cache can't be written.
+            if cls.write_cache(cache_file, buffer):
+                table = cls.read_cache(cache_file, stat)
+            if table is None:
+                table = cls.from_buffer(buffer)
+        table.source_stat = (stat.st_mtime_ns, stat.st_size)
+        return table
+
+
+    def is_current(self, csv_path):
+        '''Return True when csv_path is unchanged since this table was loaded'''
+        try:
+            stat = os.stat(csv_path)
+        except OSError:
+            return self.source_stat is None
+        return self.source_stat == (stat.st_mtime_ns, stat.st_size)
+
+
+    @classmethod
+    def from_rows(cls, rows, custom=False):
+        '''Build an in-memory table from CSV rows: name, classifier, post count, aliases. Custom rows have no classifier'''
+        return cls.from_buffer(cls.compile_rows(rows, custom))
+
+
+    @staticmethod
+    def read_entries(rows, custom=False):
+        '''Return {true_name: [classifier_id, similar_names, post_count]} for CSV rows: name, classifier, post count, aliases.
+        Custom rows have no classifier, repeated names are merged into their first row'''
+        entries = {}
+        for row in rows:
+            if not row or row[0].startswith('###'):
+                continue
+            true_name = row[0]
+            classifier_id = '' if custom or len(row) < 2 else row[1]
+            post_count = int(row[2]) if len(row) > 2 and row[2].isdigit() else 0
+            similar_names = [name for name in row[3].split(',') if name] if len(row) > 3 else []
+            if true_name in entries:
+                entry = entries[true_name]
+                entry[0] = classifier_id or entry[0]
+                entry[1].extend(similar_names)
+                entry[2] = max(entry[2], post_count)
+            else:
+                entries[true_name] = [classifier_id, similar_names, post_count]
+        return entries
+
+
+    @classmethod
+    def compile_rows(cls, rows, custom=False, stat=None, typo_index=True):
+        '''Return the cache file contents for CSV rows, stamped with the stat of their CSV. With typo_index=False the typo index is left empty'''
+        entries = cls.read_entries(rows, custom)
+        names = list(entries)
+        classifier_table = []
+        classifier_lookup = {}
+        classifier_ids = array('H')
+        alias_fields = []
+        key_entries = []
+        post_counts = []
+        for row, (classifier_id, similar_names, post_count) in enumerate(entries.values()):
+            if classifier_id not in classifier_lookup:
+                classifier_lookup[classifier_id] = len(classifier_table)
+                classifier_table.append(classifier_id)
+            classifier_ids.append(classifier_lookup[classifier_id])
+            similar_names = list(dict.fromkeys(similar_names))
+            alias_fields.append(','.join(similar_names))
+            key_entries.append((names[row], row))
+            key_entries.extend((sim_name, row) for sim_name in similar_names)
+            post_counts.append(post_count)
+        key_entries.sort()
+        keys = [key for key, _ in key_entries]
+        key_rows = array('I', [row for _, row in key_entries])
+        ranks = array('I', bytes(4 * len(names)))
+        for rank, row in enumerate(sorted(range(len(names)), key=lambda row: -post_counts[row])):
+            ranks[row] = rank
+        rank_keys = array('I', sorted(range(len(keys)), key=lambda position: ranks[key_rows[position]]))
+        grams, gram_offsets, gram_postings = cls.build_gram_index(keys)
+        typo_buckets, typo_hashes, typo_groups = cls.build_typo_index(keys if typo_index else [])
+        sections = [
+            *StringTable.pack(names),
+            '\n'.join(classifier_table).encode('utf-8'),
+            classifier_ids,
+            *StringTable.pack(alias_fields),
+            ranks,
+            *StringTable.pack(keys),
+            key_rows,
+            rank_keys,
+            *StringTable.pack(grams),
+            gram_offsets,
+            gram_postings,
+            typo_buckets,
+            typo_hashes,
+            typo_groups,
+            ]
+        sections = [bytes(section) for section in sections]
+        header = cls.cache_header.pack(cls.cache_magic, cls.cache_version, sys.byteorder == "little", stat.st_mtime_ns if stat else 0, stat.st_size if stat else 0)
+        lengths = struct.pack(f"<{cls.section_count}I", *(len(section) for section in sections))
+        return b''.join([header, lengths] + [section + bytes(-len(section) % cls.section_align) for section in sections])
+
+
+    @classmethod
+    def build_gram_index(cls, keys):
+        '''Return the sorted trigrams of keys, the offset of each posting list, and the flat posting lists'''
+        size = cls.gram_size
+        postings = {}
+        for position, key in enumerate(keys):
+            for gram in {key[i:i + size] for i in range(len(key) - size + 1)}:
+                posting = postings.get(gram)
+                if posting is None:
+                    postings[gram] = posting = array('I')
+                posting.append(position)
+        grams = sorted(postings)
+        gram_offsets = array('I', [0])
+        gram_offsets.extend(accumulate(len(postings[gram]) for gram in grams))
+        gram_postings = array('I')
+        for gram in grams:
+            gram_postings.extend(postings[gram])
+        return grams, gram_offsets, gram_postings
+
+
+    @classmethod
+    def build_typo_index(cls, keys):
+        '''Return the bucket offsets and low 16 bits of the sorted hashes of the deletes of each distinct key prefix, and the first key position of each hash's prefix'''
+        entries = array('Q')
+        for size, distance in cls.typo_distances.items():
+            groups = {}
+            for position, key in enumerate(keys):
+                groups.setdefault(key[:size], position)
+            for prefix, position in groups.items():
+                entries.extend([zlib.crc32(variant.encode('utf-8'), size) << 32 | position for variant in cls.get_deletes(prefix, distance)])
+        entries = sorted(entries)
+        typo_buckets = array('I', [bisect_left(entries, bucket << 48) for bucket in range((1 << 16) + 1)])
+        typo_hashes = array('H', [entry >> 32 & 0xFFFF for entry in entries])
+        typo_groups = array('I', [entry & 0xFFFFFFFF for entry in entries])
+        return typo_buckets, typo_hashes, typo_groups
+
+
+    @staticmethod
+    def get_deletes(word, distance):
+        '''Return word and every string made by deleting up to distance characters from it'''
+        deletes = {word}
+        edge = {word}
+        for _ in range(distance):
+            edge = {variant[:i] + variant[i + 1:] for variant in edge for i in range(len(variant))}
+            deletes |= edge
+        return deletes
+
+
+    @classmethod
+    def read_cache(cls, cache_file, stat):
+        '''Return the table mapped from the cache, or None when the cache is missing, stale, or unreadable'''
+        try:
+            with open(cache_file, 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        header_size = cls.cache_header.size
+        if len(buffer) >= header_size and cls.cache_header.unpack_from(buffer)[3:] == (stat.st_mtime_ns, stat.st_size):
+            table = cls.from_buffer(buffer)
+            if table is not None:
+                return table
+        buffer.close()
+        return None
+
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        '''Return the table viewing the cache contents in buffer, or None when they don't belong to this version'''
+        header_size = cls.cache_header.size
+        if len(buffer) < header_size + 4 * cls.section_count:
+            return None
+        magic, version, byteorder, _, _ = cls.cache_header.unpack_from(buffer)
+        if (magic, version, byteorder) != (cls.cache_magic, cls.cache_version, sys.byteorder == "little"):
+            return None
+        lengths = struct.unpack_from(f"<{cls.section_count}I", buffer, header_size)
+        starts = []
+        offset = header_size + 4 * cls.section_count
+        for length in lengths:
+            starts.append(offset)
+            offset += length + -length % cls.section_align
+        if offset != len(buffer):
+            return None
+        view = memoryview(buffer)
+        sections = [view[start:start + length] for start, length in zip(starts, lengths)]
+        for n in (1, 5, 6, 8, 9, 10, 12, 13, 14, 15, 17):
+            sections[n] = sections[n].cast('I')
+        for n in (3, 16):
+            sections[n] = sections[n].cast('H')
+        _, name_offsets, classifiers_blob, classifier_ids, _, alias_offsets, ranks, _, key_offsets, key_rows, rank_keys, _, gram_text_offsets, gram_offsets, gram_postings, typo_buckets, typo_hashes, typo_groups = sections
+        # Each string table's last offset must land one past the end of its blob.
+        for blob, offsets in ((0, name_offsets), (4, alias_offsets), (7, key_offsets), (11, gram_text_offsets)):
+            if not offsets or offsets[-1] != (lengths[blob] + 1 if len(offsets) > 1 else 0):
+                return None
+        names = StringTable(view, starts[0], name_offsets)
+        alias_fields = StringTable(view, starts[4], alias_offsets)
+        keys = StringTable(view, starts[7], key_offsets)
+        grams = StringTable(view, starts[11], gram_text_offsets)
+        classifier_table = str(classifiers_blob, 'utf-8').split('\n')
+        num_rows = len(names)
+        num_keys = len(keys)
+        if len(alias_fields) != num_rows or len(classifier_ids) != num_rows or len(ranks) != num_rows or len(key_rows) != num_keys or len(rank_keys) != num_keys:
+            return None
+        if len(gram_offsets) != len(grams) + 1 or len(typo_buckets) != (1 << 16) + 1 or typo_buckets[-1] != len(typo_hashes) or len(typo_hashes) != len(typo_groups):
+            return None
+        return cls(names, classifier_table, classifier_ids, alias_fields, ranks, keys, key_rows, rank_keys, grams, gram_offsets, gram_postings, typo_buckets, typo_hashes, typo_groups)
+
+
+    @staticmethod
+    def write_cache(cache_file, buffer):
+        '''Write the compiled buffer to the cache file, return False when it can't be written'''
+        temp_file = cache_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(temp_file, 'wb') as file:
+                file.write(buffer)
+            os.replace(temp_file, cache_file)
+            return True
+        except OSError:
+            try:
+                os.remove(temp_file)
+            except OSError: pass
+            return False
+
+
+    def find_row(self, true_name):
+        '''Return the row of a true name, or None when it isn't in this table'''
+        keys = self.keys
+        i = bisect_left(keys, true_name)
+        while i < len(keys) and keys[i] == true_name:
+            row = self.key_rows[i]
+            if self.names[row] == true_name:
+                return row
+            i += 1
+        return None
+
+
+    def get_name_rows(self, prefix):
+        '''Return the rows whose true name starts with prefix'''
+        start, stop = self.get_prefix_range(prefix)
+        names, keys, key_rows = self.names, self.keys, self.key_rows
+        return [key_rows[i] for i in range(start, stop) if names[key_rows[i]] == keys[i]]
+
+
+    def row_matches(self, row, text, pattern=None):
+        '''Return True when the true name or an alias of row matches text, '*' is a wildcard'''
+        if row is None:
+            return False
+        for key in [self.names[row]] + self.get_aliases(row):
+            if key.startswith(text) if pattern is None else pattern.match(key):
+                return True
+        return False
+
+
+    def get_classifier(self, row):
+        return self.classifier_table[self.classifier_ids[row]]
+
+
+    def get_aliases(self, row):
+        alias_field = self.alias_fields[row]
+        return alias_field.split(',') if alias_field else []
+
+
+    def get_prefix_range(self, prefix):
+        '''Return the (start, stop) slice of the key table that starts with prefix'''
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + '\U0010ffff', start)
+        return start, stop
+
+
+    def get_posting(self, gram):
+        '''Return the sorted key positions containing gram'''
+        grams = self.grams
+        n = bisect_left(grams, gram)
+        if n == len(grams) or grams[n] != gram:
+            return ()
+        return self.gram_postings[self.gram_offsets[n]:self.gram_offsets[n + 1]]
+
+
+    def get_matches(self, text, pattern=None, candidates=None):
+        '''Return the key positions whose key matches text, '*' is a wildcard. Candidates are the matches of an earlier query that text extends'''
+        fragments = text.split('*')
+        start, stop = self.get_prefix_range(fragments[0])
+        if pattern is None or not any(fragments[1:]):
+            return range(start, stop)
+        keys = self.keys
+        size = self.gram_size
+        grams = {fragment[i:i + size] for fragment in fragments for i in range(len(fragment) - size + 1)}
+        postings = sorted((self.get_posting(gram) for gram in grams), key=len)
+        bound = min(stop - start, len(postings[0]) if postings else stop - start)
+        if bound == len(keys):
+            # Filtering a dense candidate list decodes most of the key table anyway, so the scan below is the cheaper choice.
+            bound = len(keys) // 8
+        if candidates is not None and len(candidates) <= bound:
+            return self.match_positions(pattern, candidates)
+        if postings and len(postings[0]) < stop - start:
+            if not fragments[0] and len(postings[0]) > RankedMatches.walk_limit:
+                return RankedMatches(self, pattern, lambda: self.get_gram_matches(pattern, postings, start, stop))
+            return self.get_gram_matches(pattern, postings, start, stop)
+        if start > 0 or stop < len(keys) or len(fragments[0]) >= size:
+            return [i for i, key in enumerate(keys[start:stop], start) if pattern.match(key)]
+        fragment = max(fragments, key=len)
+        return RankedMatches(self, pattern, lambda: self.scan_key_text(pattern, fragment))
+
+
+    def get_gram_matches(self, pattern, postings, start, stop):
+        '''Return the positions in start, stop that are in every posting and match pattern'''
+        gram_matches = set(postings[0])
+        for posting in postings[1:]:
+            if len(posting) > 8 * len(gram_matches):
+                break
+            gram_matches.intersection_update(posting)
+        return self.match_positions(pattern, [i for i in gram_matches if start <= i < stop])
+
+
+    def match_positions(self, pattern, positions):
+        '''Return the positions whose key matches pattern, dense positions decode their span of the key table at once'''
+        if not positions:
+            return []
+        keys = self.keys
+        low, high = min(positions), max(positions) + 1
+        if 8 * len(positions) < high - low:
+            return [i for i in positions if pattern.match(keys[i])]
+        span = keys[low:high]
+        return [i for i in positions if pattern.match(span[i - low])]
+
+
+    def get_typo_matches(self, text, max_distance, max_rows=None):
+        '''Return (matches, num_rows). matches is (distance, position) for every key that starts within max_distance edits of text, excluding exact prefix matches.
+        Swapping two neighbouring characters counts as one edit. The walk stops early once it has computed max_rows edit distance rows'''
+        size = min(len(text), self.typo_prefix_length)
+        if max_distance > self.typo_distances.get(size, 0):
+            return [], 0
+        typo_buckets, typo_hashes, typo_groups = self.typo_buckets, self.typo_hashes, self.typo_groups
+        groups = set()
+        for variant in self.get_deletes(text[:size], max_distance):
+            hashed = zlib.crc32(variant.encode('utf-8'), size)
+            low, bucket_stop = hashed & 0xFFFF, typo_buckets[(hashed >> 16) + 1]
+            start = bisect_left(typo_hashes, low, typo_buckets[hashed >> 16], bucket_stop)
+            groups.update(typo_groups[start:bisect_right(typo_hashes, low, start, bucket_stop)])
+        # Each group starts at the first key with its prefix, so its keys are decoded from there until the prefix ends.
+        return self.walk_typo_runs(text, max_distance, [self.get_prefix_run(start, size) for start in sorted(groups)], max_rows)
+
+
+    @classmethod
+    def walk_typo_runs(cls, text, max_distance, runs, max_rows=None):
+        '''Return (matches, num_rows), matches is (distance, position) for the keys of runs that start within max_distance edits of text.
+        Each run is (start, keys), with keys sorted and the position of keys[0] at start. Keys are left unvisited once max_rows rows are computed'''
+        matches = []
+        num_rows = 0
+        depth_limit = len(text) + max_distance
+        # Keys shorter than this are too short to come within max_distance of text.
+        min_length = len(text) - max_distance
+        # Walk the sorted keys like a trie: rows[j] is the edit distance row of key[:j] against text, shared by keys with that prefix.
+        # best[j] is the closest any of key[:1] to key[:j] gets to the whole text.
+        rows = [list(range(len(text) + 1))]
+        best = [len(text)]
+        previous_key = ''
+        for start, range_keys in runs:
+            stop = start + len(range_keys)
+            position = start
+            while position < stop:
+                if max_rows is not None and num_rows >= max_rows:
+                    return matches, num_rows
+                key = range_keys[position - start]
+                if len(key) < min_length:
+                    position += 1
+                    continue
+                key = key[:depth_limit]
+                depth = 0
+                shared_limit = min(len(rows) - 1, len(key), len(previous_key))
+                while depth < shared_limit and key[depth] == previous_key[depth]:
+                    depth += 1
+                del rows[depth + 1:]
+                del best[depth + 1:]
+                previous_key = key
+                for j in range(depth + 1, len(key) + 1):
+                    row = cls.get_distance_row(text, key, j, rows, max_distance)
+                    rows.append(row)
+                    num_rows += 1
+                    best.append(min(best[-1], row[-1]))
+                    if min(row) > max_distance:
+                        # No key below key[:j] can get closer, they all keep the best distance of the shorter prefixes.
+                        subtree_stop = start + bisect_left(range_keys, key[:j] + '\U0010ffff', position - start, stop - start)
+                        distance = best[-1]
+                        if 0 < distance <= max_distance:
+                            matches.extend((distance, subtree_position) for subtree_position in range(position, subtree_stop))
+                        position = subtree_stop
+                        break
+                else:
+                    distance = best[-1]
+                    if 0 < distance <= max_distance:
+                        matches.append((distance, position))
+                    position += 1
+        return matches, num_rows
+
+
+    def get_prefix_run(self, start, size):
+        '''Return start and the keys from start that begin with the first size characters of keys[start], or equal it when it's shorter'''
+        keys = self.keys
+        stop = start + 4
+        run = keys[start:stop]
+        prefix = run[0][:size]
+        bound = prefix + '\U0010ffff' if len(prefix) == size else prefix + '\x00'
+        while run[-1] < bound and stop < len(keys):
+            stop = start + 4 * (stop - start)
+            run = keys[start:stop]
+        return start, run[:bisect_left(run, bound)]
+
+
+    @staticmethod
+    def get_distance_row(text, key, j, rows, max_distance):
+        '''Return the edit distance row of key[:j] against every prefix of text, given the rows of the shorter key prefixes.
+        Only the cells within max_distance of the diagonal can be within max_distance, the others are left at max_distance + 1'''
+        previous_row = rows[j - 1]
+        two_rows_back = rows[j - 2] if j > 1 else None
+        key_char = key[j - 1]
+        over = max_distance + 1
+        row = [over] * (len(text) + 1)
+        row[0] = min(j, over)
+        for i in range(max(1, j - max_distance), min(len(text), j + max_distance) + 1):
+            char = text[i - 1]
+            cost = previous_row[i - 1] + (char != key_char)
+            if previous_row[i] + 1 < cost:
+                cost = previous_row[i] + 1
+            if row[i - 1] + 1 < cost:
+                cost = row[i - 1] + 1
+            if two_rows_back and i > 1 and char == key[j - 2] and text[i - 2] == key_char and two_rows_back[i - 2] + 1 < cost:
+                cost = two_rows_back[i - 2] + 1
+            row[i] = cost if cost < over else over
+        return row
+
+
+    def scan_key_text(self, pattern, fragment):
+        '''Return the position of every key containing fragment and matching pattern.
+        The encoded fragment is searched for in the key blob itself, so only the keys it's found in are decoded'''
+        if not fragment:
+            return range(len(self.keys))
+        keys = self.keys
+        if not len(keys):
+            return []
+        offsets = keys.offsets
+        find = keys.view.obj.find
+        needle = fragment.encode('utf-8')
+        blob_start = keys.start
+        blob_end = blob_start + offsets[-1] - 1
+        positions = []
+        found = find(needle, blob_start, blob_end)
+        while found != -1:
+            i = bisect_right(offsets, found - blob_start) - 1
+            if pattern.match(keys[i]):
+                positions.append(i)
+            found = find(needle, blob_start + offsets[i + 1], blob_end)
+        return positions
+
+
+#endregion
+#region - CLASS: RankedMatches
+
+
+class RankedMatches:
+    '''The matches of a wildcard query with nothing before its first '*' and no selective trigram, like '*a' or '*_'.
+    Such queries rank every match by post count alone, so the most popular keys are checked first and the walk stops once the top suggestions are found.
+    Only when the first walk_limit keys hold too few matches are all matches resolved, by the trigram postings or a scan of the key text'''
+    walk_limit = 4096
+
+    def __init__(self, table, pattern, resolve):
+        self.table = table
+        self.pattern = pattern
+        self.resolve = resolve
+
+
+    def __len__(self):
+        # Never small enough to be narrowed by the next query, which searches the table again.
+        return len(self.table.keys)
+
+
+    def __iter__(self):
+        '''Yield the matching key positions in post count order'''
+        table = self.table
+        keys, rank_keys, match = table.keys, table.rank_keys, self.pattern.match
+        walk = min(self.walk_limit, len(rank_keys))
+        for i in rank_keys[:walk]:
+            if match(keys[i]):
+                yield i
+        if walk == len(rank_keys):
+            return
+        walked = set(rank_keys[:walk])
+        ranks, key_rows = table.ranks, table.key_rows
+        yield from sorted((i for i in self.resolve() if i not in walked), key=lambda i: (ranks[key_rows[i]], i))
+
+
+#endregion
+#region - CLASS: CustomTags
+
+
+class CustomTags(TagTable):
+    '''The live shard of 'my_tags.csv'. Tags are inserted into and removed from the sorted key table in place, the CSV only persists them.
+    Custom dictionaries are small, so wildcards and typos are checked against every key instead of a trigram or delete index'''
+    def __init__(self, entries=None):
+        entries = entries or {}
+        self.names = list(entries)
+        self.classifier_table = ['']
+        self.classifier_ids = [0] * len(self.names)
+        self.alias_fields = []
+        self.ranks = [0] * len(self.names)
+        for rank, row in enumerate(sorted(range(len(self.names)), key=lambda row: -entries[self.names[row]][2])):
+            self.ranks[row] = rank
+        key_entries = []
+        for row, (_, similar_names, _) in enumerate(entries.values()):
+            similar_names = list(dict.fromkeys(similar_names))
+            self.alias_fields.append(','.join(similar_names))
+            key_entries.append((self.names[row], row))
+            key_entries.extend((sim_name, row) for sim_name in similar_names)
+        key_entries.sort()
+        self.keys = [key for key, _ in key_entries]
+        self.key_rows = [row for _, row in key_entries]
+        # Removed rows stay behind as None, so the rows of the remaining tags don't move.
+        self.size = len(self.names)
+        self.source_stat = None
+
+
+    def __len__(self):
+        return self.size
+
+
+    @classmethod
+    def load(cls, csv_path, custom=True):
+        '''Return the shard for csv_path, read straight from the CSV without a cache'''
+        entries = {}
+        if os.path.isfile(csv_path):
+            with open(csv_path, newline='', encoding='utf-8') as csvfile:
+                entries = cls.read_entries(csv.reader(csvfile), custom=True)
+        table = cls(entries)
+        table.record_stat(csv_path)
+        return table
+
+
+    def record_stat(self, csv_path):
+        '''Mark csv_path as matching this shard, after the shard wrote the change it just made'''
+        try:
+            stat = os.stat(csv_path)
+            self.source_stat = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            self.source_stat = None
+
+
+    @property
+    def rank_keys(self):
+        ranks, key_rows = self.ranks, self.key_rows
+        return sorted(range(len(self.keys)), key=lambda position: ranks[key_rows[position]])
+
+
+    def get_entries(self):
+        '''Return [(true_name, similar_names)] of the tags in rank order'''
+        rows = sorted((row for row, true_name in enumerate(self.names) if true_name is not None), key=self.ranks.__getitem__)
+        return [(self.names[row], self.get_aliases(row)) for row in rows]
+
+
+    def insert(self, true_name, similar_names=()):
+        '''Add a tag below every other tag, or add new aliases to a tag that already exists'''
+        row = self.find_row(true_name)
+        if row is None:
+            row = len(self.names)
+            self.names.append(true_name)
+            self.classifier_ids.append(0)
+            self.alias_fields.append('')
+            self.ranks.append(row)
+            self.size += 1
+            self.insert_key(true_name, row)
+        aliases = self.get_aliases(row)
+        new_aliases = [name for name in dict.fromkeys(similar_names) if name and name not in aliases]
+        self.alias_fields[row] = ','.join(aliases + new_aliases)
+        for name in new_aliases:
+            self.insert_key(name, row)
+
+
+    def insert_key(self, key, row):
+        keys, key_rows = self.keys, self.key_rows
+        i = bisect_right(keys, key)
+        while i > 0 and keys[i - 1] == key and key_rows[i - 1] > row:
+            i -= 1
+        keys.insert(i, key)
+        key_rows.insert(i, row)
+
+
+    def remove(self, true_name):
+        '''Remove a tag and its aliases, nothing is done when it isn't in this shard'''
+        row = self.find_row(true_name)
+        if row is None:
+            return
+        keys, key_rows = self.keys, self.key_rows
+        for key in [true_name] + self.get_aliases(row):
+            i = bisect_left(keys, key)
+            while i < len(keys) and keys[i] == key:
+                if key_rows[i] == row:
+                    del keys[i]
+                    del key_rows[i]
+                    break
+                i += 1
+        self.names[row] = None
+        self.alias_fields[row] = ''
+        self.size -= 1
+
+
+    def get_matches(self, text, pattern=None, candidates=None):
+        '''Return the key positions whose key matches text, '*' is a wildcard. Candidates are the matches of an earlier query that text extends'''
+        start, stop = self.get_prefix_range(text.split('*')[0])
+        if pattern is None:
+            return range(start, stop)
+        keys = self.keys
+        return [i for i in (range(start, stop) if candidates is None else candidates) if pattern.match(keys[i])]
+
+
+    def get_typo_matches(self, text, max_distance, max_rows=None):
+        '''Return (matches, num_rows), matches is (distance, position) for every key that starts within max_distance edits of text, excluding exact prefix matches'''
+        if max_distance > self.typo_distances.get(min(len(text), self.typo_prefix_length), 0):
+            return [], 0
+        return self.walk_typo_runs(text, max_distance, [(0, self.keys)], max_rows)
+
+
+#endregion
+#region - CLASS: Autocomplete
+
+
+class Autocomplete:
+    # Edit distance rows a typo correction may compute across every table, so a prefix shared by thousands of keys can't stall typing.
+    typo_row_budget = 2048
+
+    def __init__(self, data_files=(), max_suggestions=4, include_my_tags=True):
+        self.max_suggestions = max_suggestions
+        # The loaded (sources, tables) in priority order, sources[n] is the CSV name of tables[n].
+        # Replaced as a whole, so a query that reads it once always sees a matching pair.
+        self.shards = ([], [])
+        # (loaded, total) shards of the latest set_dictionaries call.
+        self.progress = (0, 0)
+        self.load_generation = 0
+        self.load_lock = threading.Lock()
+        # Held by each query, so the custom shard is never edited halfway through one.
+        self.query_lock = threading.Lock()
+        # (source, csv_path) of the custom shard.
+        self.custom_file = None
+        # Stack of (text, key positions per table) for the queries typed so far in the current word, valid for query_stack_tables.
+        self.query_stack = []
+        self.query_stack_size = 32
+        self.query_stack_tables = None
+        # Tags of the open folder, ranked ahead of the dictionaries by how many captions use them.
+        self.dataset_tags = DatasetTags()
+        self.include_dataset_tags = True
+        self.set_dictionaries(data_files, include_my_tags)
+
+
+    def set_dictionaries(self, data_files, include_my_tags=True, additional_file='my_tags.csv', background=False):
+        '''Use the given CSVs from 'main/dict', followed by 'my_tags.csv'. Shards that are already loaded and unchanged are kept.
+
+        With background=True the missing shards are loaded by a worker thread and swapped in one at a time,
+        so suggestions keep coming from the shards that are ready while the rest load.
+        A shard without a cache is first swapped in parsed from its CSV, then again once its cache is compiled.
+        '''
+        application_path = get_application_path()
+        csv_paths = {data_file: (os.path.join(application_path, "main/dict", data_file), False) for data_file in data_files}
+        if include_my_tags:
+            csv_paths[additional_file] = (os.path.join(application_path, additional_file), True)
+        self.custom_file = (additional_file, csv_paths[additional_file][0]) if include_my_tags else None
+        loaded = dict(zip(*self.shards))
+        ready = {}
+        for source, (csv_path, custom) in csv_paths.items():
+            table = loaded.get(source)
+            if table is not None and table.is_current(csv_path):
+                ready[source] = table
+        with self.load_lock:
+            self.load_generation += 1
+            generation = self.load_generation
+        self.publish_shards(generation, csv_paths, ready)
+        if len(ready) == len(csv_paths) and all(table.compiled for table in ready.values()):
+            return
+        if background:
+            threading.Thread(target=self.load_shards, args=(generation, csv_paths, ready, True), daemon=True).start()
+        else:
+            self.load_shards(generation, csv_paths, ready)
+
+
+    def load_shards(self, generation, csv_paths, ready, background=False):
+        '''Load the shards missing from ready, publishing after each one. Stops when a newer set_dictionaries call takes over.
+        With background=True missing caches are compiled after every shard is published, each compiled shard is published again'''
+        for source, (csv_path, custom) in csv_paths.items():
+            if source in ready:
+                continue
+            if generation != self.load_generation:
+                return
+            try:
+                if custom:
+                    ready[source] = CustomTags.load(csv_path)
+                else:
+                    ready[source] = TagTable.load(csv_path, compile_cache=not background)
+            except (OSError, ValueError, csv.Error):
+                ready[source] = CustomTags() if custom else TagTable.from_rows([])
+            self.publish_shards(generation, csv_paths, ready)
+        for source, (csv_path, custom) in csv_paths.items():
+            if ready[source].compiled:
+                continue
+            if generation != self.load_generation:
+                return
+            try:
+                ready[source] = TagTable.load(csv_path)
+            except (OSError, ValueError, csv.Error):
+                continue
+            self.publish_shards(generation, csv_paths, ready)
+
+
+    def publish_shards(self, generation, csv_paths, ready):
+        '''Swap in the shards that are ready, in priority order'''
+        with self.load_lock:
+            if generation != self.load_generation:
+                return
+            sources = [source for source in csv_paths if source in ready]
+            self.shards = (sources, [ready[source] for source in sources])
+            self.progress = (len(sources), len(csv_paths))
+
+
+    def add_custom_tag(self, true_name, similar_names=()):
+        '''Insert a tag that was just appended to the custom CSV into its live shard, instead of reloading the CSV'''
+        self.edit_custom_tags(lambda table: table.insert(true_name, similar_names))
+
+
+    def update_custom_tags(self):
+        '''Bring the custom shard up to date after the custom CSV was rewritten.
+        Removed tags and tags added at the end are edited in place, any other change rebuilds the shard from the CSV'''
+        if self.custom_file is None:
+            return
+        try:
+            with open(self.custom_file[1], newline='', encoding='utf-8') as csvfile:
+                entries = TagTable.read_entries(csv.reader(csvfile), custom=True)
+        except (OSError, ValueError, csv.Error):
+            entries = {}
+        def update(table):
+            old_entries = table.get_entries()
+            kept = [(true_name, similar_names) for true_name, similar_names in old_entries if true_name in entries]
+            new_entries = [(true_name, list(dict.fromkeys(similar_names))) for true_name, (_, similar_names, _) in entries.items()]
+            if kept != new_entries[:len(kept)] or any(entry[2] for entry in entries.values()):
+                return CustomTags(entries)
+            for true_name, _ in old_entries:
+                if true_name not in entries:
+                    table.remove(true_name)
+            for true_name, similar_names in new_entries[len(kept):]:
+                table.insert(true_name, similar_names)
+        self.edit_custom_tags(update)
+
+
+    def edit_custom_tags(self, edit):
+        '''Apply edit to the loaded custom shard, or publish the shard it returns instead. The shard is marked current with its CSV'''
+        if self.custom_file is None:
+            return
+        source, csv_path = self.custom_file
+        with self.query_lock, self.load_lock:
+            sources, tables = self.shards
+            if source not in sources:
+                return
+            index = sources.index(source)
+            table = edit(tables[index])
+            if not isinstance(table, CustomTags):
+                table = tables[index]
+            table.record_stat(csv_path)
+            # New lists, so the query stack of the old key positions is dropped.
+            self.shards = (list(sources), tables[:index] + [table] + tables[index + 1:])
+
+
+    def is_loading(self):
+        loaded, total = self.progress
+        return loaded < total
+
+
+    def get_entry(self, true_name):
+        '''Return (classifier_id, similar_names, source) for a true name, from the first shard that has it'''
+        for source, table in zip(*self.shards):
+            row = table.find_row(true_name)
+            if row is not None:
+                return (table.get_classifier(row), table.get_aliases(row), source)
+        return None
+
+
+    def get_suggestion(self, text):
+        with self.query_lock:
+            return self.find_suggestions(text)
+
+
+    def get_related_suggestion(self, caption):
+        '''Return suggestions for an empty tag slot, the dataset tags most often used with the tags already in caption'''
+        if not self.include_dataset_tags:
+            return None
+        with self.query_lock:
+            return [(tag, self.get_entry(tag) or ('', [], DatasetTags.source)) for tag in self.dataset_tags.get_related(caption, self.max_suggestions)]
+
+
+    def find_suggestions(self, text):
+        sources, tables = self.shards
+        dataset_tags = self.dataset_tags if self.include_dataset_tags else ()
+        if not any(tables) and not dataset_tags:
+            return None
+        text_with_underscores = text.replace(" ", "_")
+        pattern = None
+        if '*' in text_with_underscores:
+            pattern = re.compile(re.escape(text_with_underscores).replace("\\*", ".*"))
+        suggestions = []
+        if dataset_tags:
+            for tag in dataset_tags.get_matches(text_with_underscores, pattern, self.max_suggestions):
+                suggestions.append((tag, self.get_entry(tag) or ('', [], DatasetTags.source)))
+        limit = self.max_suggestions - len(suggestions)
+        found = {tag for tag, _ in suggestions}
+        table_positions = self.get_positions(text_with_underscores, pattern, tables)
+        ranked = self.rank_matches(text_with_underscores, pattern, tables, table_positions, limit, found)
+        if len(ranked) < limit and pattern is None:
+            found.update(tables[table_index].names[row] for table_index, row in ranked)
+            ranked += self.rank_typo_matches(text_with_underscores, tables, found, limit - len(ranked))
+        for table_index, row in ranked:
+            table = tables[table_index]
+            suggestions.append((table.names[row], (table.get_classifier(row), table.get_aliases(row), sources[table_index])))
+        return suggestions
+
+
+    def rank_matches(self, text, pattern, tables, table_positions, limit, found=()):
+        '''Return (table_index, row) of the best limit matches whose true name isn't in found, ordered by score, then table, then post count.
+
+        Apart from exact names and custom tags, no match can score more than the length of the text before the first '*'.
+        Those few are scored up front, then broad queries are walked in post count order and stop once that bound is reached.
+        '''
+        if limit <= 0:
+            return []
+        bound = len(text.split('*')[0])
+        heap = []
+        seen = set(found)
+        for table_index, table in enumerate(tables):
+            if '' in table.classifier_table:
+                seed_rows = table.get_name_rows(text.split('*')[0])
+            elif pattern is None:
+                seed_rows = [table.find_row(text)]
+            else:
+                seed_rows = table.get_name_rows(text.split('*')[0] + '*')
+            for row in seed_rows:
+                if row is None or table.names[row] in seen or not table.row_matches(row, text, pattern):
+                    continue
+                true_name = table.names[row]
+                score = self.score(true_name, table.get_classifier(row), text)
+                if score <= bound or any(other.row_matches(other.find_row(true_name), text, pattern) for other in tables[:table_index]):
+                    continue
+                seen.add(true_name)
+                self.push_ranked(heap, limit, (score, -table_index, -table.ranks[row], row))
+        for table_index, (table, positions) in enumerate(zip(tables, table_positions)):
+            if len(heap) == limit and heap[0][0] >= bound:
+                break
+            names, key_rows, ranks = table.names, table.key_rows, table.ranks
+            in_order = isinstance(positions, RankedMatches) or len(positions) * len(positions) > limit * len(table.keys)
+            if isinstance(positions, RankedMatches):
+                positions = iter(positions)
+            elif in_order:
+                matches = positions if isinstance(positions, range) else set(positions)
+                positions = (i for i in table.rank_keys if i in matches)
+            for i in positions:
+                row = key_rows[i]
+                true_name = names[row]
+                if true_name in seen:
+                    continue
+                seen.add(true_name)
+                self.push_ranked(heap, limit, (self.score(true_name, table.get_classifier(row), text), -table_index, -ranks[row], row))
+                if in_order and len(heap) == limit and heap[0][0] >= bound:
+                    break
+        return [(-item[1], item[3]) for item in sorted(heap, reverse=True)]
+
+
+    def rank_typo_matches(self, text, tables, found, limit):
+        '''Return (table_index, row) of the closest typo corrections of text not in found, ordered by distance, then table, then post count.
+        The tables share typo_row_budget, spent in priority order, so a correction that needs more is left out of the later tables'''
+        max_distance = self.get_typo_distance(text)
+        if not max_distance:
+            return []
+        best = {}
+        rows_left = self.typo_row_budget
+        # Corrections rank by distance, then table, so once limit names are found every table left at this distance ranks after them.
+        for max_distance in range(1, max_distance + 1):
+            for table_index, table in enumerate(tables):
+                if len(best) >= limit or rows_left <= 0:
+                    break
+                matches, num_rows = table.get_typo_matches(text, max_distance, rows_left)
+                rows_left -= num_rows
+                for distance, position in matches:
+                    row = table.key_rows[position]
+                    true_name = table.names[row]
+                    if true_name in found:
+                        continue
+                    item = (distance, table_index, table.ranks[row], row)
+                    if true_name not in best or item < best[true_name]:
+                        best[true_name] = item
+            if len(best) >= limit or rows_left <= 0:
+                break
+        return [(table_index, row) for distance, table_index, rank, row in nsmallest(limit, best.values())]
+
+
+    @staticmethod
+    def get_typo_distance(text):
+        '''Return how many typos to allow in text, short words get fewer so corrections stay relevant'''
+        return TagTable.typo_distances.get(min(len(text), TagTable.typo_prefix_length), 0)
+
+
+    @staticmethod
+    def push_ranked(heap, limit, item):
+        '''Keep the best limit items in heap, heap[0] is the worst of them'''
+        if len(heap) < limit:
+            heappush(heap, item)
+        elif heap and item > heap[0]:
+            heapreplace(heap, item)
+
+
+    def get_positions(self, text, pattern, tables):
+        '''Return the matching key positions of each table, narrowing the matches of an earlier query that text extends'''
+        stack = self.query_stack
+        if self.query_stack_tables is not tables:
+            stack.clear()
+            self.query_stack_tables = tables
+        while stack and not text.startswith(stack[-1][0]):
+            stack.pop()
+        if stack and stack[-1][0] == text:
+            return stack[-1][1]
+        previous = stack[-1][1] if stack else [None] * len(tables)
+        positions = [table.get_matches(text, pattern, candidates) for table, candidates in zip(tables, previous)]
+        stack.append((text, positions))
+        del stack[:-self.query_stack_size]
+        return positions
+
+
+    def get_score(self, suggestion, text):
+        entry = self.get_entry(suggestion)
+        return self.score(suggestion, entry[0] if entry else '', text)
+
+
+    def score(self, suggestion, classifier_id, text):
+        score = 0
+        if suggestion == text:
+            score += len(text) * 2
+        else:
+            for i in range(len(text)):
+                if i < len(suggestion) and suggestion[i] == text[i]:
+                    score += 1
+                else:
+                    break
+        if classifier_id == '' and suggestion[:3] == text[:3]:
+            score += 1
+        return score
+
+
+#endregion
+#region - CLASS: DatasetTags
+
+
+class DatasetTags:
+    '''Tag counts of the captions in the open folder. The folder is read once, then each saved or externally edited caption only moves the counts of its changed tags'''
+    source = 'dataset'
+    # How many of a tag's most frequent neighbors are kept ready for related tag queries.
+    neighbor_limit = 32
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # file_tags[text_file] is the set of tags counted for that caption, counts[tag] is how many captions use the tag.
+        self.file_tags = {}
+        self.counts = Counter()
+        # Tags with a count, sorted so prefix queries are two bisects.
+        self.keys = []
+        # pair_counts[tag][other] is how many captions use both tags, neighbors[tag] caches the top of pair_counts[tag] until it changes.
+        self.pair_counts = {}
+        self.neighbors = {}
+        self.load_generation = 0
+        # Captions updated while the folder is being read, reapplied over what the reader found.
+        self.pending = None
+        # read_text(text_file) returns a caption's text or None, set_files can read through the viewer's dataset index instead.
+        self.read_text = self.read_file
+
+
+    def __len__(self):
+        return len(self.keys)
+
+
+    @staticmethod
+    def read_file(text_file):
+        try:
+            with open(text_file, 'r', encoding='utf-8') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+
+    @staticmethod
+    def get_tags(text):
+        '''Return the set of tags in a caption, spelled with underscores like queries'''
+        return {tag.strip().replace(' ', '_') for tag in text.replace('\n', ',').split(',') if tag.strip()}
+
+
+    def set_files(self, text_files, background=False, read_text=None):
+        '''Count the tags of text_files, replacing the previous folder. With background=True the files are read by a worker thread.
+
+        read_text(text_file) is used to read the captions here and in add_files, it must be safe to call from the worker thread.
+        '''
+        with self.lock:
+            self.read_text = read_text or self.read_file
+            self.load_generation += 1
+            generation = self.load_generation
+            self.file_tags, self.counts, self.keys = {}, Counter(), []
+            self.pair_counts, self.neighbors = {}, {}
+            self.pending = {}
+        if background:
+            threading.Thread(target=self.load_files, args=(generation, list(text_files)), daemon=True).start()
+        else:
+            self.load_files(generation, text_files)
+
+
+    def load_files(self, generation, text_files):
+        file_tags = {}
+        counts = Counter()
+        pair_counts = {}
+        read_text = self.read_text
+        for text_file in text_files:
+            if generation != self.load_generation:
+                return
+            try:
+                tags = self.get_tags(read_text(text_file) or '')
+            except (OSError, UnicodeDecodeError):
+                continue
+            if tags:
+                file_tags[text_file] = tags
+                counts.update(tags)
+                for tag in tags:
+                    if tag not in pair_counts:
+                        pair_counts[tag] = Counter()
+                    pair_counts[tag].update(tags)
+        with self.lock:
+            if generation != self.load_generation:
+                return
+            pending = self.pending
+            self.file_tags, self.counts, self.keys, self.pending = file_tags, counts, sorted(counts), None
+            self.pair_counts, self.neighbors = pair_counts, {}
+            for text_file, tags in pending.items():
+                self.apply(text_file, tags)
+
+
+    def add_files(self, text_files):
+        '''Count the tags of more captions on a worker thread, keeping the captions already counted'''
+        with self.lock:
+            generation = self.load_generation
+        threading.Thread(target=self.load_more_files, args=(generation, list(text_files)), daemon=True).start()
+
+
+    def load_more_files(self, generation, text_files):
+        file_tags = {}
+        read_text = self.read_text
+        for text_file in text_files:
+            if generation != self.load_generation:
+                return
+            try:
+                file_tags[text_file] = self.get_tags(read_text(text_file) or '')
+            except (OSError, UnicodeDecodeError):
+                continue
+        with self.lock:
+            if generation != self.load_generation:
+                return
+            for text_file, tags in file_tags.items():
+                if self.pending is not None:
+                    self.pending[text_file] = tags
+                self.apply(text_file, tags)
+
+
+    def update_file(self, text_file, text=None):
+        '''Recount the tags of a saved caption, text=None drops a deleted caption'''
+        tags = self.get_tags(text) if text else set()
+        with self.lock:
+            if self.pending is not None:
+                self.pending[text_file] = tags
+            self.apply(text_file, tags)
+
+
+    def apply(self, text_file, tags):
+        old_tags = self.file_tags.pop(text_file, set())
+        if tags:
+            self.file_tags[text_file] = tags
+        counts, keys = self.counts, self.keys
+        for tag in old_tags - tags:
+            counts[tag] -= 1
+            if counts[tag] <= 0:
+                del counts[tag]
+                del keys[bisect_left(keys, tag)]
+        for tag in tags - old_tags:
+            if tag not in counts:
+                insort(keys, tag)
+            counts[tag] += 1
+        self.move_pairs(old_tags - tags, old_tags, -1)
+        self.move_pairs(tags - old_tags, tags, 1)
+
+
+    def move_pairs(self, changed, tags, step):
+        '''Add step to the pair count of every changed tag with every tag of the caption, counting each pair once per direction'''
+        pair_counts, neighbors = self.pair_counts, self.neighbors
+        for tag in changed:
+            for other in tags:
+                pairs = [(tag, other)] if other == tag or other in changed else [(tag, other), (other, tag)]
+                for first, second in pairs:
+                    tag_pairs = pair_counts.get(first)
+                    if tag_pairs is None:
+                        tag_pairs = pair_counts[first] = Counter()
+                    tag_pairs[second] += step
+                    if tag_pairs[second] <= 0:
+                        del tag_pairs[second]
+                        if not tag_pairs:
+                            del pair_counts[first]
+                    neighbors.pop(first, None)
+
+
+    def get_matches(self, text, pattern=None, limit=4):
+        '''Return the limit most used tags matching text, '*' is a wildcard'''
+        if limit <= 0:
+            return []
+        prefix = text.split('*')[0]
+        with self.lock:
+            keys, counts = self.keys, self.counts
+            start = bisect_left(keys, prefix)
+            matches = keys[start:bisect_left(keys, prefix + '\U0010ffff', start)]
+            if pattern is not None:
+                matches = [tag for tag in matches if pattern.match(tag)]
+            return nsmallest(limit, matches, key=lambda tag: (-counts[tag], tag))
+
+
+    def get_neighbors(self, tag):
+        '''Return [(other, pair_count), ...] of the tags most often used alongside tag, the tag itself excluded'''
+        neighbors = self.neighbors.get(tag)
+        if neighbors is None:
+            tag_pairs = self.pair_counts.get(tag, {})
+            neighbors = nsmallest(self.neighbor_limit + 1, tag_pairs.items(), key=lambda item: (-item[1], item[0]))
+            neighbors = self.neighbors[tag] = [item for item in neighbors if item[0] != tag][:self.neighbor_limit]
+        return neighbors
+
+
+    def get_related(self, text, limit=4):
+        '''Return the limit tags most likely to be added to a caption, by how often they share captions with its tags.
+
+        Each tag of the caption adds pair_count / count for its cached neighbors, so a query only walks those short lists.
+        A caption without counted tags gets the most used tags of the folder.
+        '''
+        if limit <= 0:
+            return []
+        tags = self.get_tags(text)
+        with self.lock:
+            counts = self.counts
+            scores = {}
+            for tag in tags:
+                count = counts.get(tag)
+                if not count:
+                    continue
+                for other, pair_count in self.get_neighbors(tag):
+                    if other not in tags:
+                        scores[other] = scores.get(other, 0) + pair_count / count
+            if not scores:
+                return nsmallest(limit, (tag for tag in counts if tag not in tags), key=lambda tag: (-counts[tag], tag))
+            return nsmallest(limit, scores, key=lambda tag: (-scores[tag], -counts[tag], tag))
+
+
+#endregion
+#region - CLASS: SuggestionWorker
+
+
+class SuggestionWorker:
+    '''Run Autocomplete queries on a background thread. Only the latest request is kept, superseded and cancelled requests are dropped'''
+    def __init__(self, autocomplete):
+        self.autocomplete = autocomplete
+        self.condition = threading.Condition()
+        self.generation = 0
+        # (generation, text, caption) waiting for the thread, and (generation, text, suggestions) of the last finished request.
+        # A request with a caption asks for the related tags of that caption instead of matches for text.
+        self.request = None
+        self.result = None
+        self.thread = None
+
+
+    def submit(self, text, caption=None):
+        '''Queue a query for text, or for the related tags of caption, replacing any request that hasn't finished'''
+        with self.condition:
+            self.generation += 1
+            self.request = (self.generation, text, caption)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+
+    def cancel(self):
+        '''Drop the pending request, a query that is already running finishes but its result is discarded'''
+        with self.condition:
+            self.generation += 1
+            self.request = None
+
+
+    def get_result(self):
+        '''Return (text, suggestions) of the latest request once it is done, otherwise None'''
+        with self.condition:
+            if self.result is None or self.result[0] != self.generation:
+                return None
+            return self.result[1:]
+
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.request is None:
+                    self.condition.wait()
+                generation, text, caption = self.request
+                self.request = None
+            if caption is None:
+                suggestions = self.autocomplete.get_suggestion(text)
+            else:
+                suggestions = self.autocomplete.get_related_suggestion(caption)
+            with self.condition:
+                if generation == self.generation:
+                    self.result = (generation, text, suggestions)
+
+
+#endregion
@@ -11,12 +11,68 @@
 Description:
 -------------
 Create a small popup window beside the mouse that displays a zoomed view of the image underneath.
+The full size image is only loaded the first time zoom is shown for an image, and the zoomed view is pasted together from cached tiles.
 
 """
 
+from collections import OrderedDict
 from tkinter import Toplevel, BooleanVar, Canvas
 from PIL import Image, ImageTk
 
+class ZoomTiles:
+    '''Serve scaled crops of an image from tiles already scaled by the zoom, cut from power of two reductions of the image'''
+    tile_size = 256
+    max_tiles = 192
+
+    def __init__(self, image):
+        if image.mode not in ("RGB", "RGBA", "L"):
+            image = image.convert("RGBA")
+        self.levels = [image]
+        # tiles[(level, scale, column, row, resample)], oldest first.
+        self.tiles = OrderedDict()
+
+    def get_level(self, scale):
+        '''Return the index of the smallest level that still has a pixel for every output pixel, reducing the image as needed'''
+        index = 0
+        while scale * 2 ** (index + 1) <= 1 and min(self.levels[index].size) > 1:
+            index += 1
+            if index == len(self.levels):
+                self.levels.append(self.levels[-1].reduce(2))
+        return index
+
+    def get_tile(self, index, scale, column, row, resample):
+        '''Return the tile at column, row of the level scaled by scale, the tile grid is in output pixels'''
+        key = (index, scale, column, row, resample)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+        level = self.levels[index]
+        size = self.tile_size
+        width = min(size, int(level.width * scale) - column * size)
+        height = min(size, int(level.height * scale) - row * size)
+        box = (column * size / scale, row * size / scale, min(level.width, (column * size + width) / scale), min(level.height, (row * size + height) / scale))
+        tile = level.resize((width, height), resample, box=box)
+        self.tiles[key] = tile
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def get_crop(self, left, top, right, bottom, scale, resample):
+        '''Return the region left, top, right, bottom of the image scaled by scale, touching only the tiles under it'''
+        index = self.get_level(scale)
+        level = self.levels[index]
+        level_scale = scale * 2 ** index
+        size = self.tile_size
+        x0, y0 = int(left * scale), int(top * scale)
+        x1 = max(x0 + 1, min(int(right * scale), int(level.width * level_scale)))
+        y1 = max(y0 + 1, min(int(bottom * scale), int(level.height * level_scale)))
+        crop = Image.new(level.mode, (x1 - x0, y1 - y0))
+        for row in range(y0 // size, (y1 - 1) // size + 1):
+            for column in range(x0 // size, (x1 - 1) // size + 1):
+                crop.paste(self.get_tile(index, level_scale, column, row, resample), (column * size - x0, row * size - y0))
+        return crop
+
 class PopUpZoom:
     def __init__(self, widget):
         # Initialize the PopUpZoom class
@@ -29,7 +85,9 @@ class PopUpZoom:
         # Initialize image attributes
         self.image = None
         self.image_path = None
+        self.source = None
         self.original_image = None
+        self.zoom_tiles = None
         self.resized_image = None
         self.resized_width = 0
         self.resized_height = 0
@@ -38,6 +96,7 @@ class PopUpZoom:
         self.saved_widget = None
         self.saved_image = None
         self.saved_image_path = None
+        self.saved_source = None
         self.saved_original_image = None
         self.saved_resized_image = None
         self.saved_resized_width = 0
@@ -70,12 +129,21 @@ class PopUpZoom:
         self.widget.bind("<Button-1>", self.hide_zoom, add="+")
         self.widget.bind("<MouseWheel>", self.zoom, add="+")
 
-    def set_image(self, image, path):
-        '''Set the image and its path'''
+    def set_image(self, image, path, source=None):
+        '''Set the image and its path, the full size image is read from source.get_zoom_source() or path when zoom first needs it'''
         if self.image == image and self.image_path == path:
             return
         self.image = image
         self.image_path = path
+        self.source = source
+        self.original_image = None
+        self.zoom_tiles = None
+
+    def load_original_image(self):
+        '''Load the full size image of the current image'''
+        if self.source is not None:
+            self.original_image = self.source.get_zoom_source(self.max_image_size)
+            return
         with open(self.image_path, 'rb') as img_file:
             self.original_image = Image.open(img_file)
             self.original_image.load()
@@ -102,16 +170,12 @@ class PopUpZoom:
 
     def create_zoomed_image(self, left, top, right, bottom):
         '''Create and display the zoomed image in the zoom window'''
-        cropped_image = self.original_image.crop((left, top, right, bottom))
-        aspect_ratio = cropped_image.width / cropped_image.height
-        if aspect_ratio > 1:
-            new_width = self.popup_size
-            new_height = int(self.popup_size / aspect_ratio)
-        else:
-            new_height = self.popup_size
-            new_width = int(self.popup_size * aspect_ratio)
+        if self.zoom_tiles is None:
+            self.zoom_tiles = ZoomTiles(self.original_image)
+        scale = self.popup_size / max(right - left, bottom - top)
         resize_method = Image.NEAREST if self.zoom_factor >= 4 else Image.LANCZOS
-        zoomed_image = cropped_image.resize((new_width, new_height), resize_method)
+        zoomed_image = self.zoom_tiles.get_crop(left, top, right, bottom, scale, resize_method)
+        new_width, new_height = zoomed_image.size
         self.zoom_photo_image = ImageTk.PhotoImage(zoomed_image)
         self.zoom_canvas.delete("all")
         x = (self.popup_size - new_width) // 2
@@ -139,6 +203,8 @@ class PopUpZoom:
             return
         if not self.zoom_enabled.get() or not (self.image and self.resized_image):
             return
+        if self.original_image is None:
+            self.load_original_image()
         x, y = event.x, event.y
         screen_width, screen_height = self.widget.winfo_screenwidth(), self.widget.winfo_screenheight()
         new_x = event.x_root + self.popup_size // 10
@@ -186,6 +252,7 @@ class PopUpZoom:
         self.saved_widget = self.widget
         self.saved_image = self.image
         self.saved_image_path = self.image_path
+        self.saved_source = self.source
         self.saved_original_image = self.original_image
         self.saved_resized_image = self.resized_image
         self.saved_resized_width = self.resized_width
@@ -195,7 +262,9 @@ class PopUpZoom:
         self.widget = None
         self.image = None
         self.image_path = None
+        self.source = None
         self.original_image = None
+        self.zoom_tiles = None
         self.resized_image = None
         self.resized_width = 0
         self.resized_height = 0
@@ -205,6 +274,7 @@ class PopUpZoom:
         self.widget = self.saved_widget
         self.image = self.saved_image
         self.image_path = self.saved_image_path
+        self.source = self.saved_source
         self.original_image = self.saved_original_image
         self.resized_image = self.saved_resized_image
         self.resized_width = self.saved_resized_width
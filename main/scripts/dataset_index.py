@@ -0,0 +1,306 @@
+"""
+########################################
+#                                      #
+#             Dataset Index            #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Keep the facts about the files of the open folder in a SQLite file, stored in the app's 'dataset_index' folder under a hash of the folder path.
+Each file's size and mtime are recorded by one directory scan, image dimensions/format and caption text are read the first time they're asked for.
+Reopening the folder only rescans it, entries whose size or mtime changed forget their facts and are read again when needed.
+Files outside the indexed folder, and files the last scan didn't see, are still served by reading the files directly.
+
+"""
+
+
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import sys
+import sqlite3
+import hashlib
+import threading
+from PIL import Image
+
+
+def get_index_path():
+    '''Return the folder used to store the dataset indexes'''
+    if getattr(sys, 'frozen', False):
+        return os.path.abspath("dataset_index")
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "main/dataset_index")
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: IndexEntry
+
+
+class IndexEntry:
+    '''The stat data of one file, and the facts read from it. Image facts and text are None until they're read'''
+    __slots__ = ('size', 'mtime_ns', 'ctime', 'atime', 'width', 'height', 'format', 'dpi_x', 'dpi_y', 'text')
+
+    def __init__(self, size, mtime_ns, ctime, atime, width=None, height=None, format=None, dpi_x=None, dpi_y=None, text=None):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.ctime = ctime
+        self.atime = atime
+        self.width = width
+        self.height = height
+        self.format = format
+        self.dpi_x = dpi_x
+        self.dpi_y = dpi_y
+        self.text = text
+
+
+    def get_row(self, name):
+        return (name, self.size, self.mtime_ns, self.ctime, self.atime, self.width, self.height, self.format, self.dpi_x, self.dpi_y, self.text)
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: DatasetIndex
+
+
+class DatasetIndex:
+    # Older versions stored the index inside the dataset folder, SQLite wrote the sidecar files next to it. These are never listed as dataset files.
+    index_filename = '.img-txt_viewer_index.db'
+    index_sidecars = ('-journal', '-wal', '-shm')
+    schema_version = 1
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path or get_index_path()
+        # get_text may be called from a worker thread, the lock guards the dirty set it adds to.
+        self.lock = threading.Lock()
+        self.folder = None
+        self.connection = None
+        # entries[filename] for every file of the folder, changed and deleted names are written on commit().
+        self.entries = {}
+        self.dirty = set()
+        self.deleted = set()
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def open(self, folder):
+        '''Load the index of folder, creating it when missing. Nothing is done if folder is already open'''
+        folder = os.path.normpath(folder)
+        if folder == self.folder:
+            return
+        self.close()
+        self.folder = folder
+        self.entries, self.dirty, self.deleted = {}, set(), set()
+        try:
+            os.makedirs(self.index_path, exist_ok=True)
+            self.connection = self.connect(self.get_index_file(folder))
+        except (sqlite3.Error, OSError):
+            self.connection = self.connect(':memory:')
+        for row in self.connection.execute("SELECT * FROM files"):
+            self.entries[row[0]] = IndexEntry(*row[1:])
+
+
+    def get_index_file(self, folder):
+        '''Return the index file of a folder, named by a hash of its absolute path so the dataset folder itself is left untouched'''
+        key = os.path.normcase(os.path.abspath(folder))
+        return os.path.join(self.index_path, hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest() + '.db')
+
+
+    def connect(self, path):
+        connection = sqlite3.connect(path)
+        try:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version != self.schema_version:
+                connection.execute("DROP TABLE IF EXISTS files")
+                connection.execute("CREATE TABLE files (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, ctime REAL, atime REAL, "
+                                   "width INTEGER, height INTEGER, format TEXT, dpi_x REAL, dpi_y REAL, text TEXT)")
+                connection.execute(f"PRAGMA user_version = {self.schema_version}")
+                connection.commit()
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+
+    def close(self):
+        if self.connection is not None:
+            self.commit()
+            self.connection.close()
+        self.folder = None
+        self.connection = None
+
+
+    def commit(self):
+        '''Write the changed and deleted entries to the index file'''
+        if self.connection is None or not (self.dirty or self.deleted):
+            return
+        with self.lock:
+            dirty, deleted = list(self.dirty), list(self.deleted)
+            self.dirty.clear()
+            self.deleted.clear()
+        try:
+            with self.connection:
+                self.connection.executemany("DELETE FROM files WHERE name = ?", ((name,) for name in deleted))
+                self.connection.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                            [self.entries[name].get_row(name) for name in dirty if name in self.entries])
+        except sqlite3.Error as e:
+            print(f"ERROR writing the dataset index: {e}")
+
+
+    def refresh(self, folder):
+        '''Scan folder once, keeping the facts of every file whose size and mtime are unchanged.
+
+        The stat data comes from the scan itself, so entries can be sorted by size or time without another syscall per file.
+        Returns the number of names in the folder, like len(os.listdir(folder)).
+        '''
+        self.open(folder)
+        entries = self.entries
+        found = set()
+        num_names = 0
+        with os.scandir(self.folder) as scan:
+            for dir_entry in scan:
+                num_names += 1
+                if self.is_index_file(dir_entry.name) or not dir_entry.is_file():
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+                found.add(dir_entry.name)
+                self.store_stat(dir_entry.name, stat)
+        for name in [name for name in entries if name not in found]:
+            del entries[name]
+            self.deleted.add(name)
+        self.commit()
+        return num_names
+
+
+    def is_index_file(self, name):
+        '''Return True for the index file and its SQLite sidecar files'''
+        if not name.startswith(self.index_filename):
+            return False
+        suffix = name[len(self.index_filename):]
+        return not suffix or suffix in self.index_sidecars
+
+
+    def store_stat(self, name, stat):
+        entry = self.entries.get(name)
+        if entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns:
+            entry.ctime, entry.atime = stat.st_ctime, stat.st_atime
+            return entry
+        entry = self.entries[name] = IndexEntry(stat.st_size, stat.st_mtime_ns, stat.st_ctime, stat.st_atime)
+        self.dirty.add(name)
+        self.deleted.discard(name)
+        return entry
+
+
+    def get_entry(self, path):
+        '''Return the entry of a file in the indexed folder, or None for missing files and other folders'''
+        folder, name = os.path.split(os.path.normpath(path))
+        if folder != self.folder:
+            return None
+        return self.entries.get(name)
+
+
+    def is_current(self, path):
+        '''Return True when the entry of a file matches it on disk, or a missing file has no entry, so the change is already recorded'''
+        folder, name = os.path.split(os.path.normpath(path))
+        if folder != self.folder:
+            return False
+        entry = self.entries.get(name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return entry is None
+        return entry is not None and entry.size == stat.st_size and entry.mtime_ns == stat.st_mtime_ns
+
+
+    def update_file(self, path, text=None):
+        '''Restat a file changed by the viewer, text is the caption it was saved with'''
+        folder, name = os.path.split(os.path.normpath(path))
+        if folder != self.folder or self.is_index_file(name):
+            return
+        try:
+            entry = self.store_stat(name, os.stat(path))
+        except OSError:
+            if self.entries.pop(name, None) is not None:
+                self.deleted.add(name)
+                self.dirty.discard(name)
+            return
+        if text is not None:
+            entry.text = text
+            self.dirty.add(name)
+
+
+    def get_size(self, path):
+        '''Return the size of a file in bytes, 0 when it doesn't exist'''
+        entry = self.get_entry(path)
+        if entry is not None:
+            return entry.size
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+
+    def get_text(self, path):
+        '''Return the text of a caption file, or None when it doesn't exist. Files without an entry, such as captions created since the last scan, are read from disk'''
+        entry = self.get_entry(path)
+        if entry is not None and entry.text is not None:
+            return entry.text
+        try:
+            with open(path, 'r', encoding="utf-8") as file:
+                text = file.read()
+        except FileNotFoundError:
+            return None
+        if entry is not None:
+            with self.lock:
+                entry.text = text
+                self.dirty.add(os.path.basename(path))
+        return text
+
+
+    def get_tags(self, path):
+        '''Return the comma separated tags of a caption file, in order'''
+        text = self.get_text(path) or ''
+        return [tag.strip() for tag in text.split(',') if tag.strip()]
+
+
+    def get_image_info(self, path):
+        '''Return (width, height, (dpi_x, dpi_y), format) of an image, opening it only when the index doesn't know it yet'''
+        entry = self.get_entry(path)
+        if entry is not None and entry.width is not None:
+            return entry.width, entry.height, (entry.dpi_x, entry.dpi_y), entry.format
+        with Image.open(path) as image:
+            width, height = image.size
+            image_format = image.format
+            dpi = self.get_dpi(image.info.get('dpi'), width, height)
+        if entry is not None:
+            entry.width, entry.height, entry.format = width, height, image_format
+            entry.dpi_x, entry.dpi_y = dpi
+            self.dirty.add(os.path.basename(path))
+        return width, height, dpi, image_format
+
+
+    @staticmethod
+    def get_dpi(dpi, width, height):
+        '''Return the dpi of an image as two floats, estimated from a 10 inch diagonal when it's missing or unreadable'''
+        if isinstance(dpi, tuple) and len(dpi) == 2:
+            try:
+                return (float(dpi[0]), float(dpi[1]))
+            except ValueError:
+                pass
+        diagonal_pixels = (width**2 + height**2)**0.5
+        diagonal_inches = 10
+        return (diagonal_pixels / diagonal_inches, diagonal_pixels / diagonal_inches)
+
+
+#endregion
+################################################################################################################################################
@@ -0,0 +1,193 @@
+"""
+########################################
+#                                      #
+#            Folder Watcher            #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Watch the open folder from a background thread and queue the files that were added, removed, or modified.
+On Linux the events come from inotify, elsewhere the folder's mtime is polled and the folder is only rescanned when it changes.
+Editing a file in place doesn't change the folder's mtime, so a slower full rescan compares each file's size and mtime as well.
+Renames are reported as a removed and an added file, so changes that keep the file count the same are still caught.
+
+"""
+
+
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import threading
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: FolderWatcher
+
+
+class FolderWatcher:
+    poll_interval = 1.0
+    full_scan_interval = 10.0
+    # inotify event masks, from <sys/inotify.h>
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.folder = None
+        self.generation = 0
+        # (kind, filename) in the order they happened, kind is 'added', 'removed', 'modified', or 'rescan' with no filename.
+        self.events = []
+
+
+    def watch(self, folder, files=None):
+        '''Start watching folder from a new thread, stopping the previous watch. Nothing is done if folder is already watched.
+
+        files is the caller's own {filename: (size, mtime_ns)} scan of the folder, polling compares against it instead of scanning again.
+        The inotify watch, or the first snapshot of the folder when polling, is taken before returning, so changes made right after the call are reported.
+        '''
+        folder = os.path.normpath(folder)
+        with self.lock:
+            if folder == self.folder:
+                return
+            self.generation += 1
+            generation = self.generation
+            self.folder = folder
+            self.events = []
+        fd = self.open_inotify(folder) if sys.platform.startswith('linux') else None
+        if fd is not None:
+            threading.Thread(target=self.run_inotify, args=(generation, fd), daemon=True).start()
+        else:
+            # The caller's scan may be older than the folder's mtime, so the first poll rescans.
+            folder_mtime = None if files is not None else self.get_mtime(folder)
+            files = self.scan(folder) if files is None else dict(files)
+            threading.Thread(target=self.run_polling, args=(generation, folder, files, folder_mtime), daemon=True).start()
+
+
+    def stop(self):
+        with self.lock:
+            self.generation += 1
+            self.folder = None
+            self.events = []
+
+
+    def get_events(self):
+        '''Return and clear the events queued since the last call'''
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+
+    def add_event(self, generation, kind, filename=None):
+        with self.lock:
+            if generation == self.generation:
+                self.events.append((kind, filename))
+
+
+    def open_inotify(self, folder):
+        '''Return an inotify file descriptor watching folder, or None when inotify isn't available'''
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(self.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        mask = self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE | self.IN_DELETE_SELF | self.IN_MOVE_SELF
+        if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+
+
+    def run_inotify(self, generation, fd):
+        try:
+            kinds = {self.IN_CREATE: 'added', self.IN_MOVED_TO: 'added', self.IN_DELETE: 'removed', self.IN_MOVED_FROM: 'removed', self.IN_CLOSE_WRITE: 'modified'}
+            while generation == self.generation:
+                if not select.select([fd], [], [], self.poll_interval)[0]:
+                    continue
+                buffer = os.read(fd, 65536)
+                offset = 0
+                while offset < len(buffer):
+                    _, event_mask, _, length = struct.unpack_from("iIII", buffer, offset)
+                    name = os.fsdecode(buffer[offset + 16:offset + 16 + length].rstrip(b'\0'))
+                    offset += 16 + length
+                    if event_mask & (self.IN_Q_OVERFLOW | self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                        self.add_event(generation, 'rescan')
+                    elif not event_mask & self.IN_ISDIR:
+                        for flag, kind in kinds.items():
+                            if event_mask & flag:
+                                self.add_event(generation, kind, name)
+        finally:
+            os.close(fd)
+
+
+    def run_polling(self, generation, folder, files, folder_mtime):
+        '''Rescan the folder when its mtime changes, and every full_scan_interval anyway, comparing the size and mtime of every file to the previous scan'''
+        last_scan = time.monotonic()
+        while generation == self.generation:
+            time.sleep(self.poll_interval)
+            mtime = self.get_mtime(folder)
+            if mtime == folder_mtime and time.monotonic() - last_scan < self.full_scan_interval:
+                continue
+            # The mtime is read before the scan, so a change made during the scan is picked up by the next poll.
+            folder_mtime, last_scan = mtime, time.monotonic()
+            new_files = self.scan(folder)
+            for filename in files.keys() - new_files.keys():
+                self.add_event(generation, 'removed', filename)
+            for filename, stat in new_files.items():
+                if filename not in files:
+                    self.add_event(generation, 'added', filename)
+                elif files[filename] != stat:
+                    self.add_event(generation, 'modified', filename)
+            files = new_files
+
+
+    @staticmethod
+    def get_mtime(folder):
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+
+
+    @staticmethod
+    def scan(folder):
+        '''Return {filename: (size, mtime_ns)} of the files in folder'''
+        files = {}
+        try:
+            with os.scandir(folder) as scan:
+                for dir_entry in scan:
+                    try:
+                        if dir_entry.is_file():
+                            stat = dir_entry.stat()
+                            files[dir_entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return files
+
+
+#endregion
+################################################################################################################################################
@@ -0,0 +1,177 @@
+"""
+########################################
+#                                      #
+#              GIF Stream              #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Play animated GIFs without decoding every frame up front.
+A background thread decodes and scales the frames just ahead of the playhead, so long GIFs start playing right away.
+Scaled frames are kept in one LRU shared by every GIF, bounded by their pixel bytes and keyed by path, mtime, frame and size.
+
+"""
+
+
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import threading
+from collections import OrderedDict
+from PIL import Image
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: FrameCache
+
+
+class FrameCache:
+    max_bytes = 64 * 1024 * 1024
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # entries[key] = (frame, duration), oldest first. key is (path, mtime_ns, index, size).
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+
+
+    def get(self, key):
+        '''Return (frame, duration) of key, or None when it isn't cached'''
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+
+    def put(self, key, frame, duration):
+        nbytes = frame.width * frame.height * len(frame.getbands())
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.num_bytes -= previous[0].width * previous[0].height * len(previous[0].getbands())
+            self.entries[key] = (frame, duration)
+            self.num_bytes += nbytes
+            while self.num_bytes > self.max_bytes and len(self.entries) > 1:
+                _, (oldest, _) = self.entries.popitem(last=False)
+                self.num_bytes -= oldest.width * oldest.height * len(oldest.getbands())
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: GifStream
+
+
+class GifStream:
+    '''Decode the frames of one GIF from a background thread, staying read_ahead frames ahead of the playhead'''
+    read_ahead = 8
+    default_duration = 100
+
+    def __init__(self, path, size, frame_cache):
+        self.path = path
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        self.size = size
+        self.frame_cache = frame_cache
+        self.condition = threading.Condition()
+        self.playhead = 0
+        # None until the decoder reaches the end of the GIF.
+        self.frame_count = None
+        # Set by stop(), and by the decoder when the GIF has no frames or can't be decoded further.
+        self.stopped = False
+        threading.Thread(target=self.run, daemon=True).start()
+
+
+    def get_key(self, index, size):
+        return (self.path, self.mtime_ns, index, size)
+
+
+    def get_frame(self, index):
+        '''Return (frame, duration) of index at the current size, or None when it isn't decoded yet. The playhead moves to index'''
+        with self.condition:
+            self.playhead = index
+            self.condition.notify()
+            key = self.get_key(index, self.size)
+        value = self.frame_cache.get(key)
+        if value is None:
+            return None
+        frame, duration = value
+        return frame, duration or self.default_duration
+
+
+    def set_size(self, size):
+        with self.condition:
+            if size != self.size:
+                self.size = size
+                self.condition.notify()
+
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+
+    def get_missing_index(self):
+        '''Return the first frame from the playhead on that isn't cached at the current size, or None when the read ahead is full'''
+        # Never read further ahead than half the cache holds, or the frames ahead would evict each other.
+        frame_bytes = self.size[0] * self.size[1] * 4
+        read_ahead = max(1, min(self.read_ahead, self.frame_cache.max_bytes // (2 * frame_bytes)))
+        for offset in range(read_ahead):
+            index = self.playhead + offset
+            if self.frame_count is not None:
+                if self.frame_count == 0:
+                    return None
+                index %= self.frame_count
+            if self.get_key(index, self.size) not in self.frame_cache:
+                return index
+        return None
+
+
+    def run(self):
+        try:
+            with Image.open(self.path) as image:
+                while True:
+                    with self.condition:
+                        index = self.get_missing_index()
+                        while not self.stopped and index is None:
+                            self.condition.wait()
+                            index = self.get_missing_index()
+                        if self.stopped:
+                            return
+                        size = self.size
+                    try:
+                        image.seek(index)
+                    except EOFError:
+                        with self.condition:
+                            self.frame_count = index
+                            if index == 0:
+                                self.stopped = True
+                                return
+                        continue
+                    frame = image.convert("RGBA").resize(size, Image.LANCZOS)
+                    self.frame_cache.put(self.get_key(index, size), frame, image.info.get('duration'))
+        except (OSError, ValueError, SyntaxError):
+            with self.condition:
+                self.stopped = True
+
+
+#endregion
+################################################################################################################################################
@@ -0,0 +1,272 @@
+"""
+########################################
+#                                      #
+#              Image Cache             #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Decode and scale the images around the current one from a small thread pool, so next/prev is usually served from memory.
+Decoded images are kept in an LRU bounded by their pixel bytes, keyed by path, mtime and the preview quality size.
+Each prefetch replaces the wanted set, queued decodes that fell out of it are skipped, so holding an arrow key doesn't pile up work.
+Images are decoded at the smallest scale that still covers the preview, JPEG through DCT scaling with draft() and other formats with reduce().
+Animated GIFs are decoded here as their first frame only, their frames are streamed by GifStream.
+A DecodedImage is shared by the preview, the image info label and PopUpZoom, the full size zoom source is only read once zoom asks for it.
+
+"""
+
+
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+
+#endregion
+################################################################################################################################################
+#region - Functions
+
+
+def get_scaled_size(original_size, target_size, max_size):
+    '''Return the size that fits original_size inside target_size, capped by max_size (width, height)'''
+    start_width, start_height = original_size
+    scale_factor = min(target_size[0] / start_width, target_size[1] / start_height)
+    new_width = max(1, min(int(start_width * scale_factor), max_size[0]))
+    new_height = max(1, min(int(start_height * scale_factor), max_size[1]))
+    return new_width, new_height
+
+
+# Image.reduce() raises for the other modes, such as palette, 1-bit and 16-bit images. Those are left to the caller's resize.
+REDUCE_MODES = ('RGB', 'RGBA', 'L', 'LA', 'CMYK', 'I', 'F')
+
+
+def open_reduced(image, size):
+    '''Load image at the smallest scale that is still at least size, returning the loaded image.
+    Images reduce() can't handle are returned at their draft scale'''
+    image.draft(None, size)
+    image.load()
+    factor = min(image.width // size[0], image.height // size[1])
+    if factor >= 2 and image.mode in REDUCE_MODES:
+        image = image.reduce(factor)
+    return image
+
+
+def get_image_bytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: DecodedImage
+
+
+class DecodedImage:
+    '''An image decoded once for the preview, with the size it was scaled to for the widget and the facts shown about it'''
+    __slots__ = ('path', 'image', 'original_size', 'file_size', 'format', 'scaled', 'zoom_source', 'nbytes')
+
+    def __init__(self, path, image, original_size, file_size, image_format):
+        self.path = path
+        self.image = image
+        self.original_size = original_size
+        self.file_size = file_size
+        self.format = image_format
+        self.scaled = None
+        self.zoom_source = None
+        self.nbytes = 0
+
+
+    def get_nbytes(self):
+        '''Return the pixel bytes held by the image, the scaled copy and the zoom source'''
+        nbytes = get_image_bytes(self.image)
+        for image in (self.scaled, self.zoom_source):
+            if image is not None:
+                nbytes += get_image_bytes(image)
+        return nbytes
+
+
+    def covers(self, target_size, max_size):
+        '''Return True when the decoded image has enough pixels to be scaled down to fit target_size, capped by max_size'''
+        width, height = get_scaled_size(self.original_size, target_size, (max_size, max_size))
+        return self.image.width >= width - 1 and self.image.height >= height - 1
+
+
+    def get_scaled(self, size, resample=Image.LANCZOS):
+        '''Return the image resized to size, reusing the LANCZOS copy made for the same size'''
+        if self.scaled is not None and self.scaled.size == size:
+            return self.scaled
+        scaled = self.image.resize(size, resample)
+        if resample == Image.LANCZOS:
+            self.scaled = scaled
+        return scaled
+
+
+    def get_zoom_source(self, max_size):
+        '''Return the full image, downscaled when it's larger than max_size. It's read the first time it's asked for.
+
+        Large images are decoded at a reduced scale when that stays within 10% of max_size, an 8K JPEG is read at half scale instead of being resized.
+        '''
+        if self.zoom_source is None:
+            with Image.open(self.path) as image:
+                if image.width > max_size or image.height > max_size:
+                    size = get_scaled_size(image.size, (max_size, max_size), (max_size, max_size))
+                    image = open_reduced(image, (max(1, int(size[0] * 0.9)), max(1, int(size[1] * 0.9))))
+                    if image.width > max_size or image.height > max_size:
+                        image = image.resize(size, Image.LANCZOS)
+                    self.zoom_source = image
+                else:
+                    image.load()
+                    self.zoom_source = image.copy()
+        return self.zoom_source
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: ImageCache
+
+
+class ImageCache:
+    max_bytes = 256 * 1024 * 1024
+    read_ahead = 3
+    read_behind = 2
+    max_scaled_size = (1280, 1280)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(1, min(4, (os.cpu_count() or 2) - 1)), thread_name_prefix="image_cache")
+        # entries[key] for the decoded images, oldest first. key is (path, mtime_ns, file_size, max_size).
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+        # The last image returned by load(), its zoom source may have been read since.
+        self.current = None
+        # pending[key] for the decodes queued or running, wanted is the keys of the last prefetch.
+        self.pending = {}
+        self.wanted = set()
+
+
+    def get_key(self, path, max_size):
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size, max_size)
+
+
+    def load(self, path, max_size, target_size):
+        '''Return the DecodedImage of path, waiting on its prefetch or decoding it here when it isn't cached'''
+        key = self.get_key(path, max_size)
+        with self.lock:
+            self.recount_current()
+            decoded = self.entries.get(key)
+            if decoded is not None and decoded.covers(target_size, max_size):
+                self.entries.move_to_end(key)
+                self.current = key
+                return decoded
+            self.wanted.add(key)
+            future = self.pending.get(key)
+        decoded = future.result() if future is not None else None
+        if decoded is None or not decoded.covers(target_size, max_size):
+            decoded = self.decode(key, target_size)
+            self.store(key, decoded)
+        with self.lock:
+            self.current = key
+        return decoded
+
+
+    def get(self, path, max_size, target_size):
+        '''Return the cached DecodedImage of path when it covers target_size, or None without decoding it'''
+        try:
+            key = self.get_key(path, max_size)
+        except OSError:
+            return None
+        with self.lock:
+            decoded = self.entries.get(key)
+        if decoded is not None and decoded.covers(target_size, max_size):
+            return decoded
+        return None
+
+
+    def recount_current(self):
+        '''Count the bytes the current image gained since it was stored, evicting to make room for them'''
+        decoded = self.entries.get(self.current)
+        if decoded is not None:
+            nbytes = decoded.get_nbytes()
+            self.num_bytes += nbytes - decoded.nbytes
+            decoded.nbytes = nbytes
+            self.evict()
+
+
+    def prefetch(self, paths, max_size, target_size):
+        '''Queue the decode of paths in order, forgetting the queued decodes of the previous call'''
+        with self.lock:
+            self.wanted = set()
+            for path in paths:
+                try:
+                    key = self.get_key(path, max_size)
+                except OSError:
+                    continue
+                self.wanted.add(key)
+                if key in self.entries and self.entries[key].covers(target_size, max_size):
+                    self.entries.move_to_end(key)
+                elif key not in self.pending:
+                    self.pending[key] = self.executor.submit(self.run, key, target_size)
+
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.num_bytes = 0
+            self.wanted = set()
+
+
+    def run(self, key, target_size):
+        try:
+            with self.lock:
+                if key not in self.wanted:
+                    return None
+            decoded = self.decode(key, target_size)
+            self.store(key, decoded)
+            return decoded
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+
+    def store(self, key, decoded):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.num_bytes -= previous.nbytes
+            decoded.nbytes = decoded.get_nbytes()
+            self.entries[key] = decoded
+            self.num_bytes += decoded.nbytes
+            self.evict()
+
+
+    def evict(self):
+        while self.num_bytes > self.max_bytes and len(self.entries) > 1:
+            _, oldest = self.entries.popitem(last=False)
+            self.num_bytes -= oldest.nbytes
+
+
+    def decode(self, key, target_size):
+        '''Open the image of key at the smallest scale that covers target_size, capped by the key's max_size, and scale it to fit target_size'''
+        path, _, file_size, max_size = key
+        with Image.open(path) as image:
+            original_size = image.size
+            image_format = image.format
+            if image_format != 'GIF':
+                image = open_reduced(image, get_scaled_size(original_size, target_size, (max_size, max_size)))
+            image.thumbnail((max_size, max_size), Image.NEAREST)
+        decoded = DecodedImage(path, image, original_size, file_size, image_format)
+        decoded.get_scaled(get_scaled_size(original_size, target_size, self.max_scaled_size))
+        return decoded
+
+
+#endregion
+################################################################################################################################################
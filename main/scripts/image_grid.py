@@ -36,7 +36,6 @@ from main.scripts.TkToolTip import TkToolTip as ToolTip
 
 class ImageGrid:
     image_cache = {1: {}, 2: {}, 3: {}}  # Cache for each thumbnail size
-    image_size_cache = {}  # Cache to store image sizes
     text_file_cache = {}  # Cache to store text file pairs
 
 
@@ -49,6 +48,7 @@ class ImageGrid:
         self.img_txt_viewer = img_txt_viewer
         self.sort_key = self.img_txt_viewer.get_file_sort_key()
         self.working_folder = self.img_txt_viewer.image_dir.get()
+        self.dataset_index = self.img_txt_viewer.dataset_index
 
         # Setup configparser and settings file
         self.config = configparser.ConfigParser()
@@ -273,6 +273,7 @@ class ImageGrid:
         self.set_size_settings()
         self.update_image_info_label()
         self.update_cache_and_grid()
+        self.dataset_index.commit()
 
 
     def update_cache_and_grid(self):
@@ -285,7 +286,7 @@ class ImageGrid:
         image_size_key = self.image_size.get()
         filtered_sorted_files = list(filter(self.filter_images, sorted(self.image_file_list, key=self.sort_key)))
         current_text_file_sizes = {
-            os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt': os.path.getsize(os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt') if os.path.exists(os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt') else 0
+            os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt': self.dataset_index.get_size(os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt')
             for filename in filtered_sorted_files}
         for filename in filtered_sorted_files:
             img_path, txt_path = self.get_image_and_text_paths(filename)
@@ -338,9 +339,9 @@ class ImageGrid:
             thumbnail.image = image
             thumbnail.grid(row=row, column=col)
             thumbnail.bind("<MouseWheel>", self.on_mousewheel)
-            filesize = os.path.getsize(filepath)
+            filesize = self.dataset_index.get_size(filepath)
             filesize = f"{filesize / 1024:.2f} KB" if filesize < 1024 * 1024 else f"{filesize / 1024 / 1024:.2f} MB"
-            width, height = Image.open(filepath).size
+            width, height = self.dataset_index.get_image_info(filepath)[:2]
             resolution = f"({width} x {height})"
             ToolTip.create(thumbnail, f"#{image_index + 1}, {os.path.basename(filepath)}, {filesize}, {resolution}", 200, 6, 12)
 
@@ -356,7 +357,7 @@ class ImageGrid:
         image_size_key = self.image_size.get()
         filtered_sorted_files = list(filter(self.filter_images, sorted(self.image_file_list, key=self.sort_key)))
         current_text_file_sizes = {
-            os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt': os.path.getsize(os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt') if os.path.exists(os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt') else 0
+            os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt': self.dataset_index.get_size(os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt')
             for filename in filtered_sorted_files}
         for image_index, filename in enumerate(filtered_sorted_files):
             if len(images) >= self.loaded_images:
@@ -378,7 +379,7 @@ class ImageGrid:
         img.thumbnail((self.max_width, self.max_height))
         position = ((self.max_width - img.width) // 2, (self.max_height - img.height) // 2)
         new_img.paste(img, position)
-        if not os.path.exists(txt_path) or os.path.getsize(txt_path) == 0:
+        if self.dataset_index.get_size(txt_path) == 0:
             flag_position = (self.max_width - self.image_flag.width, self.max_height - self.image_flag.height)
             new_img.paste(self.image_flag, flag_position, mask=self.image_flag)
         self.image_cache[self.image_size.get()][img_path] = new_img
@@ -389,7 +390,7 @@ class ImageGrid:
         if not filename.lower().endswith(self.supported_filetypes):
             return False
         txt_path = os.path.splitext(os.path.join(self.working_folder, filename))[0] + '.txt'
-        file_size = os.path.getsize(txt_path) if os.path.exists(txt_path) else 0
+        file_size = self.dataset_index.get_size(txt_path)
         filter_dict = {"All": True, "Paired": file_size != 0, "Unpaired": file_size == 0}
         if not filter_dict.get(self.pair_filter_var.get(), False):
             return False
@@ -500,10 +501,7 @@ class ImageGrid:
 
         try:
             if current_filter == "Resolution" or current_filter == "Aspect Ratio":
-                if filename not in self.image_size_cache:
-                    with Image.open(os.path.join(self.working_folder, filename)) as img:
-                        self.image_size_cache[filename] = img.size
-                img_width, img_height = self.image_size_cache[filename]
+                img_width, img_height = self.dataset_index.get_image_info(os.path.join(self.working_folder, filename))[:2]
 
                 if current_filter == "Resolution" and not check_resolution(img_width, img_height):
                     return False
@@ -511,7 +509,7 @@ class ImageGrid:
                     return False
             elif current_filter == "Filesize":
                 target_size = float(filter_value) * 1024 * 1024
-                actual_size = os.path.getsize(os.path.join(self.working_folder, filename))
+                actual_size = self.dataset_index.get_size(os.path.join(self.working_folder, filename))
                 if not check_filesize(actual_size, target_size):
                     return False
             elif current_filter == "Filename":
@@ -522,12 +520,8 @@ class ImageGrid:
                 if not check_filetype(filter_value.strip(".").lower()):
                     return False
             elif current_filter == "Tags":
-                if os.path.exists(txt_path):
-                    with open(txt_path, 'r') as file:
-                        tags = file.read()
-                        if not check_tags(tags):
-                            return False
-                else:
+                tags = self.dataset_index.get_text(txt_path)
+                if tags is None or not check_tags(tags):
                     return False
         except Exception:
             return False
@@ -551,7 +545,7 @@ class ImageGrid:
         position = ((self.max_width - img.width) // 2, (self.max_height - img.height) // 2)
         new_img.paste(img, position)
         if current_text_file_size is None:
-            current_text_file_size = os.path.getsize(txt_path) if os.path.exists(txt_path) else 0
+            current_text_file_size = self.dataset_index.get_size(txt_path)
         if current_text_file_size == 0:
             flag_position = (self.max_width - self.image_flag.width, self.max_height - self.image_flag.height)
             new_img.paste(self.image_flag, flag_position, mask=self.image_flag)
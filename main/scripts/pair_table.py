@@ -0,0 +1,496 @@
+"""
+########################################
+#                                      #
+#              Pair Table              #
+#                                      #
+#   Version : v1.00                    #
+#   Author  : github.com/Nenotriple    #
+#                                      #
+########################################
+
+Description:
+-------------
+Store the image/text pairs of the open folder as one shared directory prefix and one interned stem per pair.
+Pairs from subfolders keep their relative folder in the stem, so a dataset tree shares the same prefix.
+The image extension is a small id into a table of the folder's extensions, and the text path is derived from the stem.
+A stem to row dict maps paths back to their index, and deleting a pair only marks its row as a tombstone.
+While tombstones exist, positions are mapped around them with a Fenwick tree, the table is compacted once half of it is tombstones.
+'image_files' and 'text_files' are list-like views of the table, so code written for two parallel lists keeps working.
+SubfolderScanner walks the subfolders of a dataset on a background thread, so their pairs can be appended while the first folder is already shown.
+
+"""
+
+
+################################################################################################################################################
+#region -  Imports
+
+
+import os
+import sys
+import threading
+from array import array
+from collections import deque
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: PairTable
+
+
+class PairTable:
+    text_extension = '.txt'
+
+    def __init__(self, image_files=(), text_dir=None, prefix=None):
+        image_files = image_files if isinstance(image_files, list) else list(image_files)
+        if prefix is not None and all(path.startswith(os.path.join(prefix, '')) for path in image_files):
+            self.prefix = os.path.join(prefix, '')
+        else:
+            self.prefix = self.get_prefix(image_files)
+        # Captions are stored next to their image unless a separate text folder is set.
+        self.set_text_dir(text_dir)
+        self.extensions = []
+        self.extension_ids = {}
+        self.stems = []
+        self.stem_extensions = array('H')
+        # rows[stem] is the row of the stem, or a tuple of rows when images only differ by extension.
+        self.rows = {}
+        # dead[row] is 1 for deleted pairs, tree is a Fenwick tree of the live rows. Both are None until a pair is deleted.
+        self.dead = None
+        self.tree = None
+        self.num_dead = 0
+        self.add_rows(image_files)
+        self.image_files = PairColumn(self, text=False)
+        self.text_files = PairColumn(self, text=True)
+
+
+    def __len__(self):
+        return len(self.stems) - self.num_dead
+
+
+    @staticmethod
+    def get_prefix(paths):
+        '''Return the longest directory, with a trailing separator, that every path starts with'''
+        if not paths:
+            return ''
+        prefix = os.path.join(os.path.dirname(paths[0]), '')
+        for path in paths:
+            while not path.startswith(prefix):
+                parent = os.path.join(os.path.dirname(os.path.dirname(prefix)), '')
+                prefix = '' if parent == prefix else parent
+        return prefix
+
+
+    def set_text_dir(self, text_dir):
+        '''Pair the images with captions in text_dir, None or the image folder itself pairs them with captions next to the images'''
+        if text_dir and os.path.normpath(text_dir) != os.path.normpath(self.prefix or '.'):
+            self.text_prefix = os.path.join(text_dir, '')
+        else:
+            self.text_prefix = None
+
+
+#endregion
+#region -  Rows
+
+
+    def split_path(self, path, text=False):
+        '''Return (stem, extension) of a path relative to the table, or None when the path is outside it'''
+        if text and self.text_prefix is not None:
+            if not path.startswith(self.text_prefix):
+                return None
+            return self.split_extension(path[len(self.text_prefix):])
+        if not path.startswith(self.prefix):
+            return None
+        return self.split_extension(path[len(self.prefix):])
+
+
+    @staticmethod
+    def split_extension(name):
+        '''Return (stem, extension) of a relative path, split at the last dot of the file name'''
+        stem, dot, extension = name.rpartition('.')
+        if not dot or '/' in extension or os.sep in extension:
+            return name, ''
+        return stem, dot + extension
+
+
+    def get_extension_id(self, extension):
+        extension_id = self.extension_ids.get(extension)
+        if extension_id is None:
+            extension_id = self.extension_ids[extension] = len(self.extensions)
+            self.extensions.append(extension)
+        return extension_id
+
+
+    def add_rows(self, image_files):
+        '''Append a row per image path, every path must start with the table's prefix'''
+        prefix_length = len(self.prefix)
+        stems, stem_extensions, extension_ids, rows = self.stems, self.stem_extensions, self.extension_ids, self.rows
+        split_extension, intern = self.split_extension, sys.intern
+        for row, path in enumerate(image_files, len(stems)):
+            stem, extension = split_extension(path[prefix_length:])
+            stem = intern(stem)
+            stems.append(stem)
+            extension_id = extension_ids.get(extension)
+            stem_extensions.append(self.get_extension_id(extension) if extension_id is None else extension_id)
+            if stem in rows:
+                self.link_row(stem, row)
+            else:
+                rows[stem] = row
+
+
+    def link_row(self, stem, row):
+        rows = self.rows.get(stem)
+        if rows is None:
+            self.rows[stem] = row
+        else:
+            self.rows[stem] = (rows if isinstance(rows, tuple) else (rows,)) + (row,)
+
+
+    def unlink_row(self, stem, row):
+        rows = self.rows.get(stem)
+        if not isinstance(rows, tuple):
+            self.rows.pop(stem, None)
+            return
+        rows = tuple(other for other in rows if other != row)
+        self.rows[stem] = rows if len(rows) > 1 else rows[0]
+
+
+    def find_row(self, path, text=False, include_dead=False):
+        '''Return the row of an image path, or of the first live image paired with a text path, otherwise None'''
+        split = self.split_path(path, text)
+        if split is None:
+            return None
+        stem, extension = split
+        if text:
+            if extension != self.text_extension:
+                return None
+            if self.text_prefix is not None:
+                # A separate text folder pairs captions by file name only.
+                return self.find_basename_row(stem, include_dead)
+        elif extension not in self.extension_ids:
+            return None
+        rows = self.rows.get(stem)
+        if rows is None:
+            return None
+        for row in (rows if isinstance(rows, tuple) else (rows,)):
+            if (text or self.extensions[self.stem_extensions[row]] == extension) and (include_dead or not self.is_dead(row)):
+                return row
+        return None
+
+
+    def find_basename_row(self, name, include_dead=False):
+        for row, stem in enumerate(self.stems):
+            if os.path.basename(stem) == name and (include_dead or not self.is_dead(row)):
+                return row
+        return None
+
+
+    def is_dead(self, row):
+        return self.dead is not None and self.dead[row]
+
+
+    def get_image_path(self, row):
+        return self.prefix + self.stems[row] + self.extensions[self.stem_extensions[row]]
+
+
+    def get_text_path(self, row):
+        if self.text_prefix is not None:
+            return self.text_prefix + os.path.basename(self.stems[row]) + self.text_extension
+        return self.prefix + self.stems[row] + self.text_extension
+
+
+    def rename_row(self, row, path, text=False):
+        '''Point a row at a new path, a text path renames the stem and keeps the image extension'''
+        split = self.split_path(path, text)
+        if split is None:
+            raise ValueError(f"{path} is outside {self.prefix}")
+        stem, extension = split
+        if text and self.text_prefix is not None:
+            stem = os.path.join(os.path.dirname(self.stems[row]), stem)
+        self.unlink_row(self.stems[row], row)
+        stem = self.stems[row] = sys.intern(stem)
+        if not text:
+            self.stem_extensions[row] = self.get_extension_id(extension)
+        self.link_row(stem, row)
+
+
+#endregion
+#region -  Positions
+
+
+    def get_row(self, position):
+        '''Return the row of the pair at position, skipping tombstones'''
+        size = len(self)
+        if position < 0:
+            position += size
+        if not 0 <= position < size:
+            raise IndexError("pair index out of range")
+        if not self.num_dead:
+            return position
+        tree = self.tree
+        row, remaining = 0, position + 1
+        step = 1 << (len(self.stems).bit_length() - 1)
+        while step:
+            next_row = row + step
+            if next_row <= len(self.stems) and tree[next_row] < remaining:
+                row = next_row
+                remaining -= tree[next_row]
+            step >>= 1
+        return row
+
+
+    def get_position(self, row):
+        '''Return the position of a live row, the number of live rows before it'''
+        if not self.num_dead:
+            return row
+        tree = self.tree
+        position = 0
+        while row > 0:
+            position += tree[row]
+            row -= row & -row
+        return position
+
+
+    def update_tree(self, row, step):
+        tree = self.tree
+        row += 1
+        while row < len(tree):
+            tree[row] += step
+            row += row & -row
+
+
+    def build_tree(self):
+        size = len(self.stems)
+        tree = array('l', [0]) * (size + 1)
+        dead = self.dead
+        for row in range(1, size + 1):
+            tree[row] += 0 if dead[row - 1] else 1
+            parent = row + (row & -row)
+            if parent <= size:
+                tree[parent] += tree[row]
+        self.tree = tree
+
+
+    def delete(self, position):
+        '''Delete the pair at position, its row stays as a tombstone so an undo can bring it back in place'''
+        row = self.get_row(position)
+        if self.dead is None:
+            self.dead = bytearray(len(self.stems))
+            self.build_tree()
+        self.dead[row] = 1
+        self.num_dead += 1
+        self.update_tree(row, -1)
+        if self.num_dead * 2 > len(self.stems):
+            self.compact()
+
+
+    def insert(self, position, path, text=False):
+        '''Bring back a deleted pair, or insert a new image at position. A text path of a live pair does nothing'''
+        if self.find_row(path, text) is not None:
+            return
+        row = self.find_row(path, text, include_dead=True)
+        if row is not None:
+            self.dead[row] = 0
+            self.num_dead -= 1
+            self.update_tree(row, 1)
+            return
+        if text:
+            return
+        image_files = list(self.image_files)
+        image_files.insert(position, path)
+        text_dir = self.text_prefix
+        self.__init__(image_files, text_dir)
+
+
+    def extend(self, image_files):
+        '''Append image paths after the last pair'''
+        if not all(path.startswith(self.prefix) for path in image_files):
+            self.__init__(list(self.image_files) + list(image_files), self.text_prefix)
+            return
+        self.add_rows(image_files)
+        if self.dead is not None:
+            self.dead.extend(bytes(len(self.stems) - len(self.dead)))
+            self.build_tree()
+
+
+    def compact(self):
+        '''Drop the tombstones, deleted pairs can't be brought back in place after this'''
+        dead = self.dead
+        live_rows = [row for row in range(len(self.stems)) if not dead[row]]
+        self.stems = [self.stems[row] for row in live_rows]
+        self.stem_extensions = array('H', (self.stem_extensions[row] for row in live_rows))
+        self.rows = {}
+        for row, stem in enumerate(self.stems):
+            self.link_row(stem, row)
+        self.dead, self.tree, self.num_dead = None, None, 0
+
+
+    def iter_rows(self):
+        dead = self.dead
+        if dead is None:
+            return iter(range(len(self.stems)))
+        return (row for row in range(len(self.stems)) if not dead[row])
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: PairColumn
+
+
+class PairColumn:
+    '''A list-like view of the image paths or the text paths of a PairTable'''
+    def __init__(self, table, text=False):
+        self.table = table
+        self.text = text
+
+
+    def __len__(self):
+        return len(self.table)
+
+
+    def get_path(self, row):
+        return self.table.get_text_path(row) if self.text else self.table.get_image_path(row)
+
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self.get_path(self.table.get_row(i)) for i in range(*position.indices(len(self)))]
+        return self.get_path(self.table.get_row(position))
+
+
+    def __setitem__(self, position, path):
+        self.table.rename_row(self.table.get_row(position), path, self.text)
+
+
+    def __delitem__(self, position):
+        self.table.delete(position)
+
+
+    def __iter__(self):
+        get_path = self.get_path
+        return (get_path(row) for row in self.table.iter_rows())
+
+
+    def __contains__(self, path):
+        return self.table.find_row(path, self.text) is not None
+
+
+    def __eq__(self, other):
+        if isinstance(other, PairColumn):
+            return self.table is other.table and self.text == other.text
+        return list(self) == other
+
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+    def __repr__(self):
+        return f"PairColumn({list(self)!r})"
+
+
+    def index(self, path):
+        '''Return the position of a path, found through the table's stem dict instead of a scan'''
+        row = self.table.find_row(path, self.text)
+        if row is None:
+            raise ValueError(f"{path!r} is not in the pair table")
+        return self.table.get_position(row)
+
+
+    def insert(self, position, path):
+        self.table.insert(position, path, self.text)
+
+
+    def remove(self, path):
+        self.table.delete(self.index(path))
+
+
+#endregion
+################################################################################################################################################
+#region - CLASS: SubfolderScanner
+
+
+def iter_subfolder_images(root, extensions, sort_key=None, skip_names=('Trash', 'text_backup')):
+    '''Yield (folder, image_paths) for each subfolder of root that holds images, breadth first so shallow folders come first.
+
+    Hidden folders and the viewer's own 'Trash' and 'text_backup' folders are skipped.
+    '''
+    pending = deque([root])
+    while pending:
+        folder = pending.popleft()
+        image_paths, subfolders = [], []
+        try:
+            with os.scandir(folder) as scan:
+                for dir_entry in scan:
+                    try:
+                        if dir_entry.is_dir(follow_symlinks=False):
+                            if dir_entry.name not in skip_names and not dir_entry.name.startswith('.'):
+                                subfolders.append(dir_entry.path)
+                        elif dir_entry.name.lower().endswith(extensions):
+                            image_paths.append(dir_entry.path)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        subfolders.sort(key=sort_key)
+        pending.extend(subfolders)
+        if folder != root and image_paths:
+            image_paths.sort(key=sort_key)
+            yield folder, image_paths
+
+
+class SubfolderScanner:
+    '''Run iter_subfolder_images on a background thread, each folder's images are kept until get_batches() takes them'''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.batches = []
+        self.done = True
+        self.finished = threading.Event()
+        self.finished.set()
+
+
+    def start(self, root, extensions, sort_key=None):
+        '''Scan the subfolders of root, cancelling the previous scan'''
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+            self.batches = []
+            self.done = False
+            self.finished.clear()
+        threading.Thread(target=self.run, args=(generation, root, extensions, sort_key), daemon=True).start()
+
+
+    def cancel(self):
+        with self.lock:
+            self.generation += 1
+            self.batches = []
+            self.done = True
+            self.finished.set()
+
+
+    def wait(self, timeout=None):
+        '''Block until the scan is done or cancelled, its batches are kept for get_batches(). Returns False on timeout'''
+        return self.finished.wait(timeout)
+
+
+    def get_batches(self):
+        '''Return and clear the (folder, image_paths) found since the last call'''
+        with self.lock:
+            batches, self.batches = self.batches, []
+        return batches
+
+
+    def run(self, generation, root, extensions, sort_key):
+        for batch in iter_subfolder_images(root, extensions, sort_key):
+            with self.lock:
+                if generation != self.generation:
+                    return
+                self.batches.append(batch)
+        with self.lock:
+            if generation == self.generation:
+                self.done = True
+                self.finished.set()
+
+
+#endregion
+################################################################################################################################################